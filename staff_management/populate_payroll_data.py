@@ -134,7 +134,7 @@ def populate_payroll_data():
     loan_types = ['salary_advance', 'emergency', 'housing']
     
     for i, staff in enumerate(sample_staff):
-        LoanRecord.objects.get_or_create(
+        loan, created = LoanRecord.objects.get_or_create(
             staff=staff,
             loan_type=loan_types[i],
             defaults={
@@ -149,6 +149,9 @@ def populate_payroll_data():
                 'end_deduction_date': date(2026, 1, 31),
             }
         )
+        # New active loans are scheduled on save; loans from earlier runs may have none
+        if not loan.installments.exists():
+            loan.generate_schedule()
     
     print("Payroll data populated successfully!")
     print(f"Created {SalaryStructure.objects.count()} salary structures")
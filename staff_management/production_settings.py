@@ -24,6 +24,14 @@ DATABASES = {
     }
 }
 
+# Cache - shared by all web and worker processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 # HTTPS Security Settings
 SECURE_SSL_REDIRECT = True
 SESSION_COOKIE_SECURE = True
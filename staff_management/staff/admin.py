@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import School, Department, Staff, Leave, Promotion, Retirement, Bereavement, HRMO
+from .models import School, Department, Staff, Leave, Promotion, Retirement, Bereavement, HRMO, StatutoryBracket
 
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
@@ -45,4 +45,9 @@ class BereavementAdmin(admin.ModelAdmin):
 class HRMOAdmin(admin.ModelAdmin):
     list_display = ['staff', 'user', 'is_active', 'created_at']
     list_filter = ['is_active']
-    search_fields = ['staff__first_name', 'staff__last_name', 'user__username']
\ No newline at end of file
+    search_fields = ['staff__first_name', 'staff__last_name', 'user__username']
+
+@admin.register(StatutoryBracket)
+class StatutoryBracketAdmin(admin.ModelAdmin):
+    list_display = ['scheme', 'effective_from', 'lower_bound', 'upper_bound', 'rate']
+    list_filter = ['scheme', 'effective_from']
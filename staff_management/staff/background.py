@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+from django.conf import settings
+
+
+def spawn_command(name, *args):
+    """Start a management command in a detached child process.
+
+    Used by views to hand long-running work (payroll runs, bulk mail) to a
+    worker that outlives the request.
+    """
+    manage_py = settings.BASE_DIR / 'manage.py'
+    return subprocess.Popen(
+        [sys.executable, str(manage_py), name, *[str(arg) for arg in args]],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
@@ -0,0 +1,156 @@
+"""Bank transfer files for a processed payroll period, one per bank.
+
+Rows are streamed from the database with .iterator() and written out line
+by line, so memory use does not grow with the size of the period. Each file
+ends with a trailer carrying the record count and total amount, which the
+bank checks against the transfers it books.
+
+A fixed-width file never cuts an account number, sort code or amount to fit
+its column: check_fixed_width() reports such transfers before a file is
+started, and fixed() refuses to write them. Only names are shortened.
+"""
+import csv
+from decimal import Decimal
+
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Payslip
+
+FORMATS = ['csv', 'fixed']
+ITERATOR_CHUNK_SIZE = 2000
+ROW_FIELDS = [
+    'staff__staff_id', 'staff__first_name', 'staff__last_name',
+    'staff__bank_sort_code', 'staff__bank_account_number', 'net_pay',
+]
+
+
+# Fixed-width detail record columns that must be written in full
+FIXED_WIDTHS = {
+    'staff__staff_id': 12,
+    'staff__bank_sort_code': 10,
+    'staff__bank_account_number': 20,
+}
+FIELD_LABELS = {
+    'staff__staff_id': 'staff ID',
+    'staff__bank_sort_code': 'sort code',
+    'staff__bank_account_number': 'account number',
+}
+
+
+class BankFileError(ValueError):
+    """A transfer that cannot be written in the requested format"""
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer in a generator"""
+
+    def write(self, value):
+        return value
+
+
+def bank_names(period):
+    """Banks that receive at least one transfer for the period"""
+    return list(
+        Payslip.objects.filter(payroll_period=period, net_pay__gt=0)
+        .order_by('staff__bank_name')
+        .values_list('staff__bank_name', flat=True)
+        .distinct()
+    )
+
+
+def bank_rows(period, bank_name):
+    """Transfers to one bank, streamed from the database in chunks"""
+    return (
+        Payslip.objects.filter(payroll_period=period, staff__bank_name=bank_name, net_pay__gt=0)
+        .order_by('staff__staff_id')
+        .values_list(*ROW_FIELDS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+
+
+def bank_filename(period, bank_name, fmt):
+    extension = 'csv' if fmt == 'csv' else 'txt'
+    return f'{slugify(period.name)}-{slugify(bank_name)}.{extension}'
+
+
+def to_cents(amount):
+    return int(amount * 100)
+
+
+def check_fixed_width(period, bank_name):
+    """Raise BankFileError naming the transfers whose details are too long for the fixed-width format"""
+    lengths = {f'{field}_length': Length(field) for field in FIXED_WIDTHS}
+    too_long = Q()
+    for field, width in FIXED_WIDTHS.items():
+        too_long |= Q(**{f'{field}_length__gt': width})
+    rows = list(
+        Payslip.objects.filter(payroll_period=period, staff__bank_name=bank_name, net_pay__gt=0)
+        .annotate(**lengths).filter(too_long)
+        .order_by('staff__staff_id').values('staff__staff_id', *lengths)
+    )
+    if rows:
+        problems = []
+        for row in rows[:10]:
+            fields = [FIELD_LABELS[field] for field, width in FIXED_WIDTHS.items() if row[f'{field}_length'] > width]
+            problems.append(f"{row['staff__staff_id']} ({', '.join(fields)})")
+        more = f' and {len(rows) - 10} more' if len(rows) > 10 else ''
+        raise BankFileError(
+            f'{len(rows)} transfers to {bank_name} do not fit the fixed-width format: {"; ".join(problems)}{more}.'
+        )
+
+
+def fixed(value, width, numeric=False, truncate=False):
+    """Left-aligned text or zero-padded number of exactly `width` characters.
+
+    Raises BankFileError if the value is longer, unless `truncate` allows
+    cutting it (only for names).
+    """
+    text = str(value) if numeric else str(value or '')
+    if len(text) > width:
+        if not truncate:
+            raise BankFileError(f'"{text}" does not fit in {width} characters.')
+        text = text[:width]
+    return text.rjust(width, '0') if numeric else text.ljust(width)
+
+
+def csv_lines(period, bank_name):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Staff ID', 'Name', 'Sort Code', 'Account Number', 'Amount'])
+    count, total = 0, Decimal('0.00')
+    for staff_id, first_name, last_name, sort_code, account_number, net_pay in bank_rows(period, bank_name):
+        count += 1
+        total += net_pay
+        yield writer.writerow([staff_id, f'{first_name} {last_name}', sort_code, account_number, f'{net_pay:.2f}'])
+    yield writer.writerow(['TOTAL', bank_name, period.name, count, f'{total:.2f}'])
+
+
+def fixed_width_lines(period, bank_name):
+    """H header, D detail and T trailer records; amounts in cents"""
+    yield (
+        'H' + fixed(bank_name, 30, truncate=True) + fixed(period.name, 30, truncate=True)
+        + timezone.now().strftime('%Y%m%d') + '\n'
+    )
+    count, total = 0, 0
+    for staff_id, first_name, last_name, sort_code, account_number, net_pay in bank_rows(period, bank_name):
+        cents = to_cents(net_pay)
+        count += 1
+        total += cents
+        yield (
+            'D' + fixed(staff_id, 12) + fixed(f'{last_name} {first_name}', 35, truncate=True)
+            + fixed(sort_code, 10) + fixed(account_number, 20) + fixed(cents, 15, numeric=True) + '\n'
+        )
+    yield 'T' + fixed(count, 9, numeric=True) + fixed(total, 18, numeric=True) + '\n'
+
+
+def bank_file_lines(period, bank_name, fmt='csv'):
+    """Lines of one bank's transfer file, generated lazily.
+
+    Raises BankFileError up front if a fixed-width file cannot be written in full.
+    """
+    if fmt == 'fixed':
+        check_fixed_width(period, bank_name)
+        return fixed_width_lines(period, bank_name)
+    return csv_lines(period, bank_name)
@@ -0,0 +1,121 @@
+"""Announcement email fan-out.
+
+Every recipient gets a message of their own, so addresses are never shown
+to one another. Messages go out over a small pool of mail connections
+driven by asyncio: each worker task owns one connection and runs its
+blocking SMTP calls on a thread of its own, a shared limiter spaces sends to
+the configured rate, and each outcome is saved to AnnouncementDelivery as
+soon as it is known, so a rerun after a crash never mails a recipient who
+already got the message. Called from the send_announcement command, which
+announcement_create starts in the background.
+"""
+import asyncio
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import AnnouncementDelivery
+from .outbox import MESSAGE_ERRORS, is_permanent
+
+MAX_ATTEMPTS = 3
+# Seconds before the first retry of a recipient, doubled for every further attempt
+RETRY_DELAY = 5
+
+
+class RateLimiter:
+    """Spaces sends at least 1/rate seconds apart across all workers"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+class DeliveryLog:
+    """Saves each recipient's outcome as it comes in and counts them"""
+
+    def __init__(self):
+        self.sent = self.failed = 0
+
+    async def record(self, pk, status, attempts, error=''):
+        await sync_to_async(AnnouncementDelivery.objects.filter(pk=pk).update)(
+            status=status, attempts=attempts, error=error,
+            sent_at=timezone.now() if status == 'sent' else None,
+        )
+        if status == 'sent':
+            self.sent += 1
+        else:
+            self.failed += 1
+
+
+def send_message(connection, message):
+    connection.open()
+    message.send()
+
+
+async def worker(queue, limiter, log, subject, body, from_email, connection_options):
+    """Send to recipients from `queue` over one connection until the queue is empty"""
+    loop = asyncio.get_running_loop()
+    connection = get_connection(**connection_options)
+    with ThreadPoolExecutor(max_workers=1) as thread:
+        try:
+            while not queue.empty():
+                pk, email = queue.get_nowait()
+                message = EmailMessage(subject, body, from_email, [email], connection=connection)
+                for attempt in range(1, MAX_ATTEMPTS + 1):
+                    await limiter.wait()
+                    try:
+                        await loop.run_in_executor(thread, send_message, connection, message)
+                    except (smtplib.SMTPException, OSError) as error:
+                        if not isinstance(error, MESSAGE_ERRORS):
+                            await loop.run_in_executor(thread, connection.close)
+                        if is_permanent(error) or attempt == MAX_ATTEMPTS:
+                            await log.record(pk, 'failed', attempt, f'{type(error).__name__}: {error}')
+                            break
+                        await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+                    else:
+                        await log.record(pk, 'sent', attempt)
+                        break
+        finally:
+            await loop.run_in_executor(thread, connection.close)
+
+
+async def fan_out(recipients, subject, body, from_email, concurrency, rate, connection_options):
+    queue = asyncio.Queue()
+    for recipient in recipients:
+        queue.put_nowait(recipient)
+    limiter = RateLimiter(rate)
+    log = DeliveryLog()
+    await asyncio.gather(*[
+        worker(queue, limiter, log, subject, body, from_email, connection_options)
+        for _ in range(min(concurrency, len(recipients)))
+    ])
+    return log.sent, log.failed
+
+
+def send_announcement(announcement, concurrency=None, rate=None, retry_failed=False, connection_options=None):
+    """Email the announcement to its pending recipients; returns (sent, failed, seconds)"""
+    concurrency = concurrency or settings.ANNOUNCEMENT_MAIL_CONCURRENCY
+    rate = settings.ANNOUNCEMENT_MAIL_RATE if rate is None else rate
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    recipients = list(announcement.deliveries.filter(status__in=statuses).order_by('id').values_list('id', 'email'))
+    subject = f"{announcement.get_announcement_type_display()}: {announcement.title}"
+
+    started = time.monotonic()
+    sent, failed = asyncio.run(fan_out(
+        recipients, subject, announcement.content, settings.DEFAULT_FROM_EMAIL,
+        concurrency, rate, connection_options or {},
+    ))
+    return sent, failed, time.monotonic() - started
@@ -0,0 +1,168 @@
+"""Staff directory listing with filters and keyset pagination.
+
+Pages are addressed by a cursor holding the sort key of the last (or first)
+row shown, so fetching any page is an index range scan of one page of rows
+rather than an OFFSET over everything before it, and no COUNT is needed.
+A search query instead lists the best full-text matches (see search).
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import BigIntegerField, Q
+
+from .models import Staff
+from .search import search_staff
+
+PAGE_SIZE = 50
+
+# Sort name -> columns, each backed by an index; id breaks ties
+SORTS = {
+    'staff_id': ['staff_id'],
+    'name': ['last_name', 'first_name'],
+    'hire_date': ['hire_date'],
+}
+SORT_LABELS = {'staff_id': 'Staff ID', 'name': 'Name', 'hire_date': 'Hire Date'}
+
+# Query parameter -> lookup
+FILTERS = {
+    'department': 'department_id',
+    'school': 'department__school_id',
+    'staff_type': 'staff_type',
+    'staff_category': 'staff_category',
+    'staff_grade': 'staff_grade',
+    'employment_type': 'employment_type',
+    'leadership_role': 'leadership_role',
+    'status': 'status',
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Sort key values from a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def cursor_values(fields, values):
+    """Cursor values converted to the sort fields' types, or None if any does not fit.
+
+    Cursors come back from the client, so a tampered one lists the first page
+    instead of failing in the query.
+    """
+    if values is None or len(values) != len(fields):
+        return None
+    converted = []
+    for field, value in zip(fields, values):
+        if not isinstance(value, (str, int)) or isinstance(value, bool):
+            return None
+        try:
+            value = Staff._meta.get_field(field).to_python(value)
+        except ValidationError:
+            return None
+        if isinstance(value, int) and abs(value) > BigIntegerField.MAX_BIGINT:
+            return None
+        converted.append(value)
+    return converted
+
+
+def keyset_filter(fields, values, descending):
+    """Rows strictly after `values` in (fields) order: a lexicographic tuple comparison"""
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__{lookup}': values[i]})
+        for previous, value in zip(fields[:i], values):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def selected_filters(params):
+    """Filter values in effect; status defaults to active, and blank or 'any' means unfiltered"""
+    selected = {name: params.get(name, '') for name in FILTERS}
+    if 'status' not in params:
+        selected['status'] = 'active'
+    return selected
+
+
+def active_filters(selected):
+    """Filter name -> value for the filters that restrict the listing"""
+    return {
+        name: value for name, value in selected.items()
+        if value and value != 'any' and (not FILTERS[name].endswith('_id') or value.isdigit())
+    }
+
+
+def filter_staff(params, skip=()):
+    """Filtered queryset and the filter values in effect, ignoring the filters named in `skip`"""
+    selected = selected_filters(params)
+    queryset = Staff.objects.all()
+    for name, value in active_filters(selected).items():
+        if name not in skip:
+            queryset = queryset.filter(**{FILTERS[name]: value})
+    return queryset, selected
+
+
+def staff_page(params, page_size=PAGE_SIZE):
+    """One page of the directory for the request's GET parameters"""
+    queryset, selected = filter_staff(params)
+    queryset = queryset.select_related('department__school', 'hrmo').with_age()
+
+    # A search shows the best matches ranked by relevance instead of paging
+    query = params.get('q', '').strip()
+    if query:
+        return {
+            'rows': search_staff(query, queryset, limit=page_size),
+            'selected': selected,
+            'query': query,
+            'sort': 'relevance',
+            'next_cursor': None,
+            'previous_cursor': None,
+        }
+
+    sort = params.get('sort', 'staff_id')
+    descending = sort.startswith('-')
+    if sort.lstrip('-') not in SORTS:
+        sort, descending = 'staff_id', False
+    fields = SORTS[sort.lstrip('-')] + ['id']
+
+    after = cursor_values(fields, decode_cursor(params.get('after')))
+    before = None if after else cursor_values(fields, decode_cursor(params.get('before')))
+    cursor = after or before
+
+    # Walking backwards reverses the order, then the page is flipped back
+    backwards = before is not None
+    reverse = descending != backwards
+    if cursor is not None:
+        queryset = queryset.filter(keyset_filter(fields, cursor, reverse))
+    ordering = [f'-{field}' if reverse else field for field in fields]
+
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return encode_cursor([getattr(row, field) for field in fields])
+
+    has_next = more if not backwards else True
+    has_previous = more if backwards else after is not None
+    return {
+        'rows': rows,
+        'selected': selected,
+        'query': '',
+        'sort': sort,
+        'next_cursor': key(rows[-1]) if rows and has_next else None,
+        'previous_cursor': key(rows[0]) if rows and has_previous else None,
+    }
@@ -0,0 +1,107 @@
+"""Facet counts for the staff directory sidebar.
+
+All facets come from one grouped query over the staff matching the
+non-facet filters (school, status), grouped by every facet field at once.
+Each facet is then counted in memory over the groups that match the other
+facets' selections, so a selected facet still lists its alternatives.
+
+Results are cached per filter signature under a version number that Staff
+and Department signals bump, so any change to the directory makes every
+cached entry unreachable without having to find and delete them.
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .directory import active_filters, filter_staff, selected_filters
+from .models import Department, Staff
+
+# Facet (also the directory filter name) -> Staff field
+FACETS = {
+    'department': 'department_id',
+    'staff_type': 'staff_type',
+    'staff_category': 'staff_category',
+    'staff_grade': 'staff_grade',
+    'employment_type': 'employment_type',
+    'leadership_role': 'leadership_role',
+}
+FACET_LABELS = {
+    'department': 'Department',
+    'staff_type': 'Type',
+    'staff_category': 'Category',
+    'staff_grade': 'Grade',
+    'employment_type': 'Employment',
+    'leadership_role': 'Leadership Role',
+}
+VERSION_KEY = 'staff-facets-version'
+CACHE_TIMEOUT = 10 * 60
+
+
+def invalidate():
+    """Make every cached facet count stale"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def choice_labels(facet):
+    if facet == 'department':
+        return dict(Department.objects.values_list('id', 'name'))
+    return dict(Staff._meta.get_field(FACETS[facet]).choices)
+
+
+def compute_facets(params):
+    """{facet: [(value, label, count), ...]} for the staff matching `params`"""
+    queryset, selected = filter_staff(params, skip=FACETS)
+    chosen = {name: value for name, value in active_filters(selected).items() if name in FACETS}
+    groups = list(queryset.values(*FACETS.values()).annotate(staff=Count('id')).order_by())
+
+    facets = {}
+    for facet, field in FACETS.items():
+        counts = Counter()
+        for group in groups:
+            if all(str(group[FACETS[other]]) == value for other, value in chosen.items() if other != facet):
+                counts[group[field]] += group['staff']
+        labels = choice_labels(facet)
+        facets[facet] = sorted(
+            ((str(value), labels.get(value, value), count) for value, count in counts.items()),
+            key=lambda item: (-item[2], str(item[1])),
+        )
+    return facets
+
+
+def facet_counts(params):
+    """Cached compute_facets, keyed on the filter values in effect"""
+    signature = hashlib.sha1(json.dumps(active_filters(selected_filters(params)), sort_keys=True).encode()).hexdigest()
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f'staff-facets:{version}:{signature}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(params)
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
+
+
+def sidebar(params):
+    """Facet counts with toggle links, for the directory template"""
+    selected = selected_filters(params)
+    sections = []
+    for facet, values in facet_counts(params).items():
+        items = []
+        for value, label, count in values:
+            query = params.copy()
+            for param in ['after', 'before']:
+                query.pop(param, None)
+            active = selected[facet] == value
+            if active:
+                query.pop(facet, None)
+            else:
+                query[facet] = value
+            items.append({'label': label, 'count': count, 'active': active, 'query': query.urlencode()})
+        items.sort(key=lambda item: not item['active'])
+        sections.append((FACET_LABELS[facet], items))
+    return sections
@@ -0,0 +1,141 @@
+"""Typo-tolerant staff lookup by staff ID and name.
+
+Every staff member's staff ID, first and last name are broken into
+trigrams (padded as pg_trgm does, so word starts weigh more) and stored in
+StaffTrigram. A lookup picks the query's rarest trigrams, up to a budget of
+index entries, fetches the staff sharing the most of them in one grouped
+query on the (trigram, staff) index, then ranks those candidates by trigram
+similarity to each of their names. Common trigrams such as a department
+prefix shared by thousands of staff IDs are left to the ranking step, which
+keeps the query cost flat as headcount grows.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Staff, StaffTrigram
+
+BATCH_SIZE = 5000
+CANDIDATES = 100
+MIN_SIMILARITY = 0.2
+SOURCE_FIELDS = ['staff_id', 'first_name', 'last_name']
+
+# Index entries a lookup may read, though never fewer than MIN_TRIGRAMS trigrams
+POSTINGS_BUDGET = 5000
+MIN_TRIGRAMS = 2
+FREQUENCY_CACHE_KEY = 'staff-trigram-frequencies'
+FREQUENCY_CACHE_TIMEOUT = 60 * 60
+
+
+def trigrams(text):
+    grams = set()
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Shared trigrams over all trigrams of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def staff_trigrams(staff_id, first_name, last_name):
+    return trigrams(f'{staff_id} {first_name} {last_name}')
+
+
+def index_staff(staff):
+    """Bring the trigram rows of a saved Staff instance up to date, writing only the difference"""
+    wanted = staff_trigrams(staff.staff_id, staff.first_name, staff.last_name)
+    existing = set(StaffTrigram.objects.filter(staff=staff).values_list('trigram', flat=True))
+    if wanted == existing:
+        return
+    with transaction.atomic():
+        StaffTrigram.objects.filter(staff=staff, trigram__in=existing - wanted).delete()
+        StaffTrigram.objects.bulk_create([StaffTrigram(staff=staff, trigram=gram) for gram in wanted - existing])
+
+
+def rebuild_index():
+    """Recreate every trigram row; returns the number of staff indexed.
+
+    Rows are inserted with executemany rather than bulk_create, since there
+    are a couple of dozen per staff member.
+    """
+    rows = Staff.objects.order_by('id').values_list('id', *SOURCE_FIELDS).iterator(chunk_size=BATCH_SIZE)
+    table = StaffTrigram._meta.db_table
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        StaffTrigram.objects.all().delete()
+        insert = f'INSERT INTO {table} (staff_id, trigram) VALUES (%s, %s)'
+        batch = []
+        for staff_pk, *values in rows:
+            batch.extend((staff_pk, gram) for gram in staff_trigrams(*values))
+            count += 1
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        cursor.executemany(insert, batch)
+    cache.delete(FREQUENCY_CACHE_KEY)
+    return count
+
+
+def trigram_frequencies():
+    """Number of staff per trigram. Only used to choose which trigrams to look up, so it may be stale"""
+    frequencies = cache.get(FREQUENCY_CACHE_KEY)
+    if frequencies is None:
+        frequencies = dict(
+            StaffTrigram.objects.values_list('trigram').annotate(staff=Count('id')).order_by()
+        )
+        cache.set(FREQUENCY_CACHE_KEY, frequencies, FREQUENCY_CACHE_TIMEOUT)
+    return frequencies
+
+
+def selective_trigrams(query_grams):
+    """The query's rarest trigrams that fit in the postings budget.
+
+    A trigram missing from the cached frequencies may belong to staff saved
+    since they were counted, so it is treated as the rarest kind rather than
+    skipped; if nobody has it, looking it up costs nothing.
+    """
+    frequencies = trigram_frequencies()
+    chosen = []
+    postings = 0
+    for gram in sorted(query_grams, key=lambda gram: (frequencies.get(gram, 1), gram)):
+        count = frequencies.get(gram, 1)
+        if len(chosen) >= MIN_TRIGRAMS and postings + count > POSTINGS_BUDGET:
+            break
+        chosen.append(gram)
+        postings += count
+    return chosen
+
+
+def lookup_staff(query, limit=10, queryset=None):
+    """Best matches for a possibly misspelt staff ID or name as (staff, score) pairs, best first"""
+    query_grams = trigrams(query)
+    lookup_grams = selective_trigrams(query_grams)
+    if not lookup_grams:
+        return []
+    candidates = list(
+        StaffTrigram.objects.filter(trigram__in=lookup_grams)
+        .values('staff_id').annotate(shared=Count('id'))
+        .order_by('-shared', 'staff_id').values_list('staff_id', flat=True)[:CANDIDATES]
+    )
+    queryset = Staff.objects.all() if queryset is None else queryset
+
+    scores = {}
+    for pk, staff_id, first_name, last_name in queryset.filter(pk__in=candidates).values_list('id', *SOURCE_FIELDS):
+        first, last = trigrams(first_name), trigrams(last_name)
+        score = max(similarity(query_grams, grams) for grams in [trigrams(staff_id), first, last, first | last])
+        if score >= MIN_SIMILARITY:
+            scores[pk] = score
+    best = sorted(scores, key=lambda pk: -scores[pk])[:limit]
+    staff = Staff.objects.select_related('department').in_bulk(best)
+    return sorted(
+        ((staff[pk], scores[pk]) for pk in best),
+        key=lambda pair: (-pair[1], pair[0].last_name, pair[0].first_name),
+    )
@@ -0,0 +1,211 @@
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from staff.models import (
+    School, Department, Staff, SalaryStructure, PayrollPeriod, LoanRecord, LoanInstallment, Leave,
+    BenefitPlan, StaffBenefit,
+)
+from staff.payroll import start_run, execute_run
+from staff.payslip_pdf import period_payslip_data, render_payslip_pdf
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = ('Benchmark payroll processing, payslip rendering and the payroll dashboard on synthetic data '
+            'in a throwaway test database, reporting JSON that can be compared across commits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Staff counts to benchmark')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes for the payroll run')
+        parser.add_argument('--pdf-sample', type=int, default=500,
+                            help='Number of payslips to render per scale (0 renders all of them)')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Skip tracemalloc; it slows Python-heavy stages noticeably, so wall times are only '
+                                 'comparable between runs made with the same setting')
+        parser.add_argument('--label', help='Label stored with the results (default: current git commit)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        report = {
+            'label': options['label'] or self.git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'workers': options['workers'],
+            'trace_memory': not options['no_memory'],
+            'results': [],
+        }
+
+        # Never touch the real database: everything runs in a test database that is dropped afterwards
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for scale in options['scales']:
+                call_command('flush', interactive=False, verbosity=0)
+                self.stderr.write(f'Benchmarking {scale} staff...')
+                report['results'].append(self.run_scale(scale, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def run_scale(self, scale, options):
+        rng = random.Random(options['seed'])
+        self.trace_memory = not options['no_memory']
+        stages = {}
+
+        period, stages['generate'] = self.measure(lambda: self.generate(scale, rng))
+
+        def process():
+            return execute_run(start_run(period)[0], workers=options['workers']).payslips_written
+        payslips, stages['process_payroll'] = self.measure(process)
+
+        def render():
+            rows = period_payslip_data(period)
+            if options['pdf_sample']:
+                rows = rows[:options['pdf_sample']]
+            for data in rows:
+                render_payslip_pdf(data)
+            return len(rows)
+        rendered, stages['render_pdf'] = self.measure(render)
+        stages['render_pdf']['payslips'] = rendered
+        stages['render_pdf']['payslips_per_second'] = round(rendered / stages['render_pdf']['wall_time'], 1)
+
+        user = User.objects.create_superuser('benchmark', 'benchmark@example.com', None)
+        client = Client()
+        client.force_login(user)
+        response, stages['payroll_dashboard'] = self.measure(lambda: client.get(reverse('payroll_dashboard')))
+        stages['payroll_dashboard']['status_code'] = response.status_code
+
+        return {'staff': scale, 'payslips': payslips, 'stages': stages}
+
+    def measure(self, func):
+        """Run func once, returning its result and its wall time, query count and peak Python memory"""
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = func()
+        elapsed = time.perf_counter() - start
+        stats = {'wall_time': round(elapsed, 4), 'queries': len(queries)}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats['peak_memory_mb'] = round(peak / 1024 / 1024, 2)
+        return result, stats
+
+    def generate(self, scale, rng):
+        """Schools, departments, structures, staff, loans, unpaid leave and benefits via bulk_create"""
+        school_count = max(1, scale // 5000)
+        schools = School.objects.bulk_create([
+            School(name=f'School {i}', code=f'SCH{i}') for i in range(school_count)
+        ])
+        departments = Department.objects.bulk_create([
+            Department(name=f'Department {i}', code=f'DEP{i}', school=schools[i % school_count])
+            for i in range(max(1, scale // 100))
+        ])
+
+        grades = [(category, grade) for grade, label in Staff.GRADE_CHOICES
+                  for category in (['junior'] if grade.startswith('j') else ['senior', 'senior_supporting'])]
+        employment_types = [code for code, label in Staff.EMPLOYMENT_TYPES]
+        SalaryStructure.objects.bulk_create([
+            SalaryStructure(
+                staff_category=category, staff_grade=grade, employment_type=employment_type,
+                basic_salary=Decimal(rng.randrange(100_000, 1_500_000)) / 100,
+                housing_allowance=Decimal(rng.randrange(0, 300_000)) / 100,
+                transport_allowance=Decimal(rng.randrange(0, 100_000)) / 100,
+            )
+            for category, grade in grades for employment_type in employment_types
+        ])
+
+        period = PayrollPeriod.objects.create(name='Benchmark', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        banks = ['Sierra Leone Commercial Bank', 'Rokel Commercial Bank', 'Ecobank', 'UBA']
+        for start in range(0, scale, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + BATCH_SIZE, scale)):
+                category, grade = rng.choice(grades)
+                batch.append(Staff(
+                    staff_id=f'BM{i:07d}', first_name=f'First{i}', last_name=f'Last{i}', email=f'bm{i}@example.com',
+                    phone='000', date_of_birth=date(1960 + i % 40, 1 + i % 12, 1 + i % 28), address='-',
+                    next_of_kin_name='-', next_of_kin_relationship='-', next_of_kin_phone='000', next_of_kin_address='-',
+                    department=rng.choice(departments), position='Lecturer', staff_type='academic',
+                    staff_category=category, staff_grade=grade, employment_type=rng.choice(employment_types),
+                    hire_date=date(2015, 1, 1), bank_name=rng.choice(banks), bank_account_number=f'{i:010d}',
+                    nassit_number=f'BMN{i:07d}', highest_qualification='MSc', institution='USL', graduation_year=2005,
+                ))
+            Staff.objects.bulk_create(batch)
+
+        staff_ids = list(Staff.objects.values_list('id', flat=True))
+
+        # About one in ten staff repaying a loan, with its installment schedule
+        loans = LoanRecord.objects.bulk_create([
+            LoanRecord(
+                staff_id=staff_id, loan_type='salary_advance', amount=Decimal('1200.00'), repayment_months=12,
+                monthly_deduction=Decimal('100.00'), balance=Decimal('1200.00'), status='active',
+                start_deduction_date=date(2024, 10, 1), end_deduction_date=date(2025, 10, 1),
+            )
+            for staff_id in rng.sample(staff_ids, len(staff_ids) // 10)
+        ], batch_size=BATCH_SIZE)
+        LoanInstallment.objects.bulk_create([
+            LoanInstallment(
+                loan=loan, installment_number=n + 1, due_date=date(2024 + (9 + n) // 12, (9 + n) % 12 + 1, 1),
+                principal=Decimal('100.00'), amount=Decimal('100.00'), balance_after=Decimal(1100 - 100 * n),
+            )
+            for loan in loans for n in range(12)
+        ], batch_size=BATCH_SIZE)
+
+        # About one in twenty staff with approved unpaid leave in the period
+        leave = []
+        for staff_id in rng.sample(staff_ids, len(staff_ids) // 20):
+            start_date = date(2025, 1, 1) + timedelta(days=rng.randrange(0, 28))
+            leave.append(Leave(
+                staff_id=staff_id, leave_type='unpaid', start_date=start_date,
+                end_date=start_date + timedelta(days=rng.randrange(0, 10)), days_requested=1,
+                reason='Benchmark', status='approved',
+            ))
+        Leave.objects.bulk_create(leave, batch_size=BATCH_SIZE)
+
+        plan = BenefitPlan.objects.create(
+            name='Health', benefit_type='health', description='Benchmark plan',
+            employer_contribution=Decimal('50.00'), employee_contribution=Decimal('25.00'),
+        )
+        StaffBenefit.objects.bulk_create([
+            StaffBenefit(staff_id=staff_id, benefit_plan=plan, enrollment_date=date(2024, 1, 1))
+            for staff_id in rng.sample(staff_ids, len(staff_ids) // 3)
+        ], batch_size=BATCH_SIZE)
+        return period
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
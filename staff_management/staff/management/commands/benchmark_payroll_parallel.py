@@ -0,0 +1,93 @@
+import os
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from staff.models import Staff
+from staff.payroll import (
+    PayrollInputs, EARNING_FIELDS, SHARD_MODES, compute_payslips, compute_payslips_parallel,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark serial vs process-pool payslip computation on a synthetic staff population'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--staff', type=int, default=30000, help='Number of synthetic staff')
+        parser.add_argument('--departments', type=int, default=120, help='Number of synthetic departments')
+        parser.add_argument('--workers', type=int, nargs='+', default=None,
+                            help='Worker counts to compare (default: 2, 4 and the CPU count)')
+        parser.add_argument('--shard-by', choices=SHARD_MODES, default='department')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per configuration; the best time is reported')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        inputs = self.synthetic_inputs(options['staff'], options['departments'], options['seed'])
+        cpus = os.cpu_count() or 1
+        worker_counts = options['workers'] or sorted({2, 4, cpus})
+        
+        serial_time, expected = self.best_of(options['repeat'], lambda: compute_payslips(inputs))
+        self.stdout.write(
+            f'{len(inputs.staff)} staff, {options["departments"]} departments, shard by {options["shard_by"]}, {cpus} CPUs'
+        )
+        self.stdout.write(f'serial      {serial_time:8.3f}s  {len(inputs.staff) / serial_time:10.0f} payslips/s')
+        
+        best_workers, best_time = 1, serial_time
+        for workers in worker_counts:
+            elapsed, result = self.best_of(
+                options['repeat'],
+                lambda: compute_payslips_parallel(inputs, workers, options['shard_by']),
+            )
+            if result != expected:
+                self.stderr.write(self.style.ERROR(f'{workers} workers produced different payslips than the serial path'))
+                continue
+            self.stdout.write(
+                f'{workers:2d} workers  {elapsed:8.3f}s  {len(inputs.staff) / elapsed:10.0f} payslips/s  '
+                f'{serial_time / elapsed:5.2f}x serial'
+            )
+            if elapsed < best_time:
+                best_workers, best_time = workers, elapsed
+        
+        if best_workers == 1:
+            self.stdout.write('No worker count beat the serial path here; keep PAYROLL_WORKERS = 1.')
+        else:
+            self.stdout.write(f'Fastest with {best_workers} workers; set PAYROLL_WORKERS = {best_workers} on this host.')
+
+    def best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def synthetic_inputs(self, staff_count, department_count, seed):
+        """Staff rows, structures and loans shaped like PayrollInputs.load output"""
+        rng = random.Random(seed)
+        grades = [(category, grade) for grade, label in Staff.GRADE_CHOICES
+                  for category in (['junior'] if grade.startswith('j') else ['senior', 'senior_supporting'])]
+        employment_types = [code for code, label in Staff.EMPLOYMENT_TYPES]
+        
+        structures = {}
+        for category, grade in grades:
+            for employment_type in employment_types:
+                basic = Decimal(rng.randrange(1_000_000, 15_000_000)) / 100
+                row = {field: (Decimal(rng.randrange(0, 300_000)) / 100) for field in EARNING_FIELDS}
+                row.update(basic_salary=basic, staff_category=category, staff_grade=grade, employment_type=employment_type)
+                structures[(category, grade, employment_type)] = row
+        
+        staff, loans = [], {}
+        for staff_id in range(1, staff_count + 1):
+            category, grade = rng.choice(grades)
+            staff.append({
+                'id': staff_id,
+                'department_id': rng.randrange(1, department_count + 1),
+                'staff_category': category,
+                'staff_grade': grade,
+                'employment_type': rng.choice(employment_types),
+            })
+            if rng.random() < 0.2:
+                loans[staff_id] = Decimal(rng.randrange(10_000, 500_000)) / 100
+        return PayrollInputs(1, staff, structures, loans)
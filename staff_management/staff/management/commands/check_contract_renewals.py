@@ -1,24 +1,22 @@
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
 from django.conf import settings
-from staff.models import Staff, HRMO
-from datetime import date
+from django.utils import timezone
+from staff.models import ContractRenewalMilestone, HRMO, OutboundEmail
 
 
 class Command(BaseCommand):
     help = 'Check and send contract renewal notifications for eligible staff'
 
     def handle(self, *args, **options):
-        staff_needing_renewal = Staff.objects.filter(status='active')
-        renewal_due = [staff for staff in staff_needing_renewal if staff.needs_contract_renewal_notification]
+        renewal_due = ContractRenewalMilestone.objects.due()
         
         notifications_sent = 0
         
-        for staff in renewal_due:
-            self.send_contract_renewal_notification(staff)
+        for milestone in renewal_due:
+            self.send_contract_renewal_notification(milestone)
             notifications_sent += 1
             self.stdout.write(
-                self.style.SUCCESS(f'Sent contract renewal notification to {staff.full_name}')
+                self.style.SUCCESS(f'Sent contract renewal notification to {milestone.staff.full_name}')
             )
         
         if notifications_sent == 0:
@@ -30,11 +28,11 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f'Successfully sent {notifications_sent} contract renewal notifications.')
             )
 
-    def send_contract_renewal_notification(self, staff):
+    def send_contract_renewal_notification(self, milestone):
         """Send contract renewal notification to staff and HRMO"""
-        contract_date = staff.contract_start_date if staff.contract_start_date else staff.hire_date
-        today = date.today()
-        years_since_contract = int((today - contract_date).days / 365.25)
+        staff = milestone.staff
+        contract_date = staff.contract_date
+        years_since_contract = milestone.years
         
         # Send to staff
         if staff.email:
@@ -54,12 +52,11 @@ Best regards,
 Human Resources
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [staff.email],
-                fail_silently=True,
             )
         
         # Send to HRMOs
@@ -81,14 +78,13 @@ Years of Service: {years_since_contract} years
 Please initiate contract renewal procedures.
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 hrmo_emails,
-                fail_silently=True,
             )
         
         # Mark notification as sent
-        staff.contract_renewal_notification_sent = True
-        staff.save()
\ No newline at end of file
+        milestone.notified_at = timezone.now()
+        milestone.save(update_fields=['notified_at'])
\ No newline at end of file
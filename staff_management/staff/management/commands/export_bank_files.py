@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from staff.models import PayrollPeriod
+from staff.bank_export import FORMATS, BankFileError, bank_file_lines, bank_filename, bank_names
+
+
+class Command(BaseCommand):
+    help = 'Write one bank transfer file per bank for a processed payroll period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='ID of the payroll period')
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='csv or fixed-width records')
+        parser.add_argument('--bank', action='append', help='Only export these banks (repeatable)')
+        parser.add_argument('--output-dir', default='.', help='Directory to write the files to')
+
+    def handle(self, *args, **options):
+        try:
+            period = PayrollPeriod.objects.get(pk=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f'Payroll period {options["period_id"]} does not exist.')
+        
+        if not period.is_processed:
+            raise CommandError(f'Payroll period "{period.name}" has not been processed yet.')
+        
+        banks = bank_names(period)
+        if options['bank']:
+            unknown = set(options['bank']) - set(banks)
+            if unknown:
+                raise CommandError(f'No transfers to {", ".join(sorted(unknown))} in "{period.name}".')
+            banks = options['bank']
+        
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for bank_name in banks:
+            path = os.path.join(options['output_dir'], bank_filename(period, bank_name, options['format']))
+            try:
+                lines = bank_file_lines(period, bank_name, options['format'])
+            except BankFileError as e:
+                raise CommandError(str(e))
+            with open(path, 'w', newline='') as output:
+                for line in lines:
+                    output.write(line)
+            self.stdout.write(f'{bank_name}: {path}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(banks)} bank files for "{period.name}".'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from staff.models import PayrollPeriod
+from staff.payslip_pdf import write_period_payslips, BATCH_MODES
+
+
+class Command(BaseCommand):
+    help = 'Render every payslip of a payroll period into a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='ID of the payroll period')
+        parser.add_argument('--output', help='Path of the ZIP file to write (default: payslips_<period_id>.zip)')
+        parser.add_argument('--mode', choices=BATCH_MODES, default='zip',
+                            help='zip: one PDF per payslip; department: one merged PDF per department')
+        parser.add_argument('--workers', type=int, default=1, help='Number of rendering processes')
+
+    def handle(self, *args, **options):
+        try:
+            period = PayrollPeriod.objects.get(pk=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f'Payroll period {options["period_id"]} does not exist.')
+        
+        if not period.is_processed:
+            raise CommandError(f'Payroll period "{period.name}" has not been processed yet.')
+        
+        output = options['output'] or f'payslips_{period.pk}.zip'
+        count, elapsed, rate = write_period_payslips(
+            period, output, mode=options['mode'], workers=options['workers'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Rendered {count} payslips to {output} in {elapsed:.2f}s ({rate:.1f} payslips/s).')
+        )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from staff import fuzzy, search
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the staff full-text search index and fuzzy lookup trigrams, '
+            'e.g. after bulk imports that bypass model signals')
+
+    def handle(self, *args, **options):
+        for name, rebuild in [('full-text', search.rebuild_index), ('trigram', fuzzy.rebuild_index)]:
+            start = time.perf_counter()
+            count = rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Indexed {count} staff in the {name} index in {time.perf_counter() - start:.1f}s.'
+            ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from staff.models import Payslip
+from staff.payroll import rebuild_year_to_date
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the year-to-date payroll totals from the payslips of processed periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('years', nargs='*', type=int, help='Years to rebuild (default: every year with processed payroll)')
+
+    def handle(self, *args, **options):
+        years = options['years'] or sorted(set(
+            Payslip.objects.filter(payroll_period__is_processed=True)
+            .values_list('payroll_period__end_date__year', flat=True)
+        ))
+
+        for year in years:
+            totals = rebuild_year_to_date(year)
+            self.stdout.write(f'{year}: {len(totals)} staff')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt year-to-date totals for {len(years)} years.'))
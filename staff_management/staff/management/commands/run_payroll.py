@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from staff.models import PayrollPeriod, PayrollRun
+from staff.payroll import start_run, execute_run
+
+
+class Command(BaseCommand):
+    help = 'Process payroll for a period in department-sized chunks, resuming any unfinished run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='ID of the payroll period to process')
+        parser.add_argument('--run', type=int, help='Resume a specific payroll run instead of the latest one')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (default 1, serial; more only after benchmarking the host)')
+
+    def handle(self, *args, **options):
+        try:
+            period = PayrollPeriod.objects.get(pk=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f'Payroll period {options["period_id"]} does not exist.')
+        
+        if period.is_processed:
+            raise CommandError(f'Payroll period "{period.name}" has already been processed.')
+        
+        if options['run']:
+            run = PayrollRun.objects.get(pk=options['run'], payroll_period=period)
+        else:
+            run, created = start_run(period)
+        
+        if run.last_department_id is not None:
+            self.stdout.write(f'Resuming run {run.pk} after department {run.last_department_id}')
+        
+        try:
+            execute_run(run, log=self.stdout.write, workers=options['workers'])
+        except Exception as e:
+            raise CommandError(f'Payroll run {run.pk} failed: {e}')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Payroll processed for {run.payslips_written} staff members in "{period.name}".')
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from staff.bulk_mail import send_announcement
+from staff.models import Announcement
+
+
+class Command(BaseCommand):
+    help = 'Email an announcement to each of its pending recipients over concurrent SMTP sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('announcement_id', type=int, help='ID of the announcement')
+        parser.add_argument('--concurrency', type=int, help='SMTP sessions to use (default: ANNOUNCEMENT_MAIL_CONCURRENCY)')
+        parser.add_argument('--rate', type=float, help='Messages per second across all sessions, 0 for no limit (default: ANNOUNCEMENT_MAIL_RATE)')
+        parser.add_argument('--retry-failed', action='store_true', help='Also resend to recipients whose delivery failed')
+        parser.add_argument('--host', help='Send through this SMTP server instead of the configured email backend')
+        parser.add_argument('--port', type=int, default=25, help='SMTP port for --host')
+
+    def handle(self, *args, **options):
+        try:
+            announcement = Announcement.objects.get(pk=options['announcement_id'])
+        except Announcement.DoesNotExist:
+            raise CommandError(f'Announcement {options["announcement_id"]} does not exist.')
+        
+        connection_options = {}
+        if options['host']:
+            connection_options = {
+                'backend': 'django.core.mail.backends.smtp.EmailBackend',
+                'host': options['host'], 'port': options['port'], 'use_tls': False, 'use_ssl': False,
+            }
+        
+        sent, failed, elapsed = send_announcement(
+            announcement, concurrency=options['concurrency'], rate=options['rate'],
+            retry_failed=options['retry_failed'], connection_options=connection_options,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent "{announcement.title}" to {sent} recipients ({failed} failed) in {elapsed:.2f}s '
+            f'({sent / elapsed if elapsed else 0:.1f} messages/s).'
+        ))
@@ -0,0 +1,63 @@
+import smtplib
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from staff.outbox import BATCH_SIZE, send_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails in batches over one reused mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Messages claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new messages')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty outbox with --loop')
+        parser.add_argument('--host', help='Send through this SMTP server instead of the configured email backend')
+        parser.add_argument('--port', type=int, default=25, help='SMTP port for --host')
+
+    def handle(self, *args, **options):
+        if options['host']:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host=options['host'], port=options['port'], use_tls=False, use_ssl=False,
+            )
+        else:
+            connection = get_connection()
+        
+        total_sent = total_failed = 0
+        started = time.monotonic()
+        try:
+            while True:
+                batch_started = time.monotonic()
+                try:
+                    sent, failed = send_batch(connection, options['batch_size'])
+                except (smtplib.SMTPException, OSError) as e:
+                    if not options['loop']:
+                        raise CommandError(f'Cannot connect to the mail server: {e}')
+                    self.stderr.write(f'Cannot connect to the mail server: {e}')
+                    time.sleep(options['interval'])
+                    continue
+                
+                if sent or failed:
+                    total_sent += sent
+                    total_failed += failed
+                    elapsed = time.monotonic() - batch_started
+                    self.stdout.write(f'Sent {sent}, failed {failed} in {elapsed:.2f}s ({sent / elapsed:.1f} messages/s)')
+                    continue
+                
+                if not options['loop']:
+                    break
+                # Idle: don't hold a connection the server will time out
+                connection.close()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} emails with {total_failed} failed attempts in {elapsed:.2f}s '
+            f'({total_sent / elapsed:.1f} messages/s).'
+        ))
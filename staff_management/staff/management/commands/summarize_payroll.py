@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from staff.models import PayrollPeriod
+from staff.payroll import summarize_period
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized payroll summaries of processed periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_ids', nargs='*', type=int, help='Periods to rebuild (default: every processed period)')
+
+    def handle(self, *args, **options):
+        periods = PayrollPeriod.objects.filter(is_processed=True)
+        if options['period_ids']:
+            periods = periods.filter(pk__in=options['period_ids'])
+        
+        for period in periods:
+            summaries = summarize_period(period)
+            self.stdout.write(f'{period.name}: {len(summaries)} summary rows')
+        
+        self.stdout.write(self.style.SUCCESS(f'Summarized {len(periods)} payroll periods.'))
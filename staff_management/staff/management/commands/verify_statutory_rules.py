@@ -0,0 +1,49 @@
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from staff.statutory import SCHEMES, evaluate, evaluate_scalar, load_tables
+
+
+class Command(BaseCommand):
+    help = 'Check the vectorized tax/NASSIT evaluator against the scalar reference and time both'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--staff', type=int, default=50000, help='Number of random salaries to evaluate')
+        parser.add_argument('--date', help='Evaluate the tables in force on this date (YYYY-MM-DD, default today)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        as_of = options['date'] or timezone.now().date().isoformat()
+        tables = load_tables(as_of)
+        rng = random.Random(options['seed'])
+        # Include exact band edges, where rounding mistakes show up first
+        cents = [rng.randrange(0, 50_000_000) for _ in range(options['staff'])]
+        cents += [bound + delta for table in tables.values() for lower, upper, rate in table
+                  for bound in (lower, upper) if bound is not None for delta in (-1, 0, 1) if bound + delta >= 0]
+        base = np.array(cents, dtype=np.int64)
+        amounts = [Decimal(value).scaleb(-2) for value in cents]
+        
+        failed = False
+        for scheme in SCHEMES:
+            start = time.perf_counter()
+            vectorized = evaluate(base, tables[scheme]).tolist()
+            vector_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            reference = [evaluate_scalar(amount, tables[scheme]) for amount in amounts]
+            scalar_time = time.perf_counter() - start
+            
+            mismatches = sum(1 for got, expected in zip(vectorized, reference) if Decimal(got).scaleb(-2) != expected)
+            failed = failed or mismatches
+            self.stdout.write(
+                f'{scheme:12s} {len(cents)} salaries  vectorized {vector_time * 1000:8.2f}ms  '
+                f'scalar {scalar_time * 1000:8.2f}ms  mismatches {mismatches}'
+            )
+        
+        if failed:
+            raise CommandError('Vectorized evaluator disagrees with the scalar reference.')
+        self.stdout.write(self.style.SUCCESS(f'Tables in force on {as_of} evaluate identically.'))
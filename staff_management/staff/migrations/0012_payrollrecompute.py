@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("staff", "0011_payrollrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollRecompute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "trigger_type",
+                    models.CharField(
+                        choices=[
+                            ("salary_structure", "Salary Structure"),
+                            ("loan", "Loan Approval"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "trigger_id",
+                    models.PositiveIntegerField(
+                        help_text="Primary key of the salary structure or loan that changed"
+                    ),
+                ),
+                ("description", models.CharField(max_length=255)),
+                ("staff_affected", models.IntegerField(default=0)),
+                ("payslips_updated", models.IntegerField(default=0)),
+                (
+                    "preview_patched",
+                    models.BooleanField(
+                        default=False, help_text="Cached preview was updated in place"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "payroll_period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recomputes",
+                        to="staff.payrollperiod",
+                    ),
+                ),
+                (
+                    "triggered_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0012_payrollrecompute"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoanInstallment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("installment_number", models.IntegerField()),
+                ("due_date", models.DateField(db_index=True)),
+                ("principal", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "interest",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "balance_after",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Outstanding principal once paid",
+                        max_digits=12,
+                    ),
+                ),
+                ("is_paid", models.BooleanField(default=False)),
+                (
+                    "loan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="installments",
+                        to="staff.loanrecord",
+                    ),
+                ),
+                (
+                    "payroll_period",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="loan_installments",
+                        to="staff.payrollperiod",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["loan", "installment_number"],
+                "unique_together": {("loan", "installment_number")},
+            },
+        ),
+    ]
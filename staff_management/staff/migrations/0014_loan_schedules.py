@@ -0,0 +1,71 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+
+
+def build_schedules(apps, schema_editor):
+    """Schedule loans approved before installments existed.
+
+    Installments that fell due in an already processed period were deducted
+    by that payroll, so they are recorded as paid against it.
+    """
+    LoanRecord = apps.get_model("staff", "LoanRecord")
+    LoanInstallment = apps.get_model("staff", "LoanInstallment")
+    PayrollPeriod = apps.get_model("staff", "PayrollPeriod")
+
+    cent = Decimal("0.01")
+    processed = list(PayrollPeriod.objects.filter(is_processed=True))
+    loans = LoanRecord.objects.filter(
+        status="active", start_deduction_date__isnull=False
+    )
+    for loan in loans:
+        months = loan.repayment_months
+        total_interest = (loan.amount * loan.interest_rate / 100).quantize(
+            cent, rounding=ROUND_HALF_UP
+        )
+        principal = (loan.amount / months).quantize(cent, rounding=ROUND_HALF_UP)
+        interest = (total_interest / months).quantize(cent, rounding=ROUND_HALF_UP)
+        balance = loan.amount
+        amount_paid = Decimal("0")
+        installments = []
+        for number in range(1, months + 1):
+            if number == months:
+                principal = balance
+                interest = total_interest - interest * (months - 1)
+            due_date = loan.start_deduction_date + relativedelta(months=number - 1)
+            period = next(
+                (p for p in processed if p.start_date <= due_date <= p.end_date), None
+            )
+            balance -= principal
+            installments.append(
+                LoanInstallment(
+                    loan=loan,
+                    installment_number=number,
+                    due_date=due_date,
+                    principal=principal,
+                    interest=interest,
+                    amount=principal + interest,
+                    balance_after=balance,
+                    is_paid=period is not None,
+                    payroll_period=period,
+                )
+            )
+            if period is not None:
+                amount_paid += principal + interest
+                loan.balance = balance
+        LoanInstallment.objects.bulk_create(installments)
+        loan.amount_paid = amount_paid
+        if loan.balance <= 0:
+            loan.status = "completed"
+        loan.save(update_fields=["amount_paid", "balance", "status"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0013_loaninstallment"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0014_loan_schedules"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("department", "Department"),
+                            ("school", "School"),
+                            ("grade", "Grade"),
+                            ("employment_type", "Employment Type"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True,
+                        help_text="Id or code of the group; blank when unassigned",
+                        max_length=50,
+                    ),
+                ),
+                ("label", models.CharField(max_length=200)),
+                ("headcount", models.IntegerField(default=0)),
+                (
+                    "gross_pay",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "net_pay",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "payroll_period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summaries",
+                        to="staff.payrollperiod",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["dimension", "label"],
+                "unique_together": {("payroll_period", "dimension", "key")},
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0015_payrollsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatutoryBracket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scheme",
+                    models.CharField(
+                        choices=[("income_tax", "Income Tax"), ("nassit", "NASSIT")],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "effective_from",
+                    models.DateField(
+                        db_index=True,
+                        help_text="Applies to periods ending on or after this date, until a later table takes over",
+                    ),
+                ),
+                (
+                    "lower_bound",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "upper_bound",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="Blank for an open top band; set it on the top band to cap the contribution",
+                        max_digits=12,
+                        null=True,
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Percentage of the salary between the bounds",
+                        max_digits=5,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["scheme", "-effective_from", "lower_bound"],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0016_statutorybracket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payslip",
+            name="benefit_deduction",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name="PayrollBenefitCost",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("enrolled_staff", models.IntegerField(default=0)),
+                (
+                    "employee_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "employer_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "benefit_plan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_costs",
+                        to="staff.benefitplan",
+                    ),
+                ),
+                (
+                    "payroll_period",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="benefit_costs",
+                        to="staff.payrollperiod",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["benefit_plan__name"],
+                "unique_together": {("payroll_period", "benefit_plan")},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0017_benefit_deductions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="leave",
+            name="leave_type",
+            field=models.CharField(
+                choices=[
+                    ("annual", "Annual Leave"),
+                    ("sick", "Sick Leave"),
+                    ("maternity", "Maternity Leave"),
+                    ("paternity", "Paternity Leave"),
+                    ("study", "Study Leave"),
+                    ("emergency", "Emergency Leave"),
+                    ("unpaid", "Unpaid Leave"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0018_unpaid_leave"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollYearToDate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                (
+                    "periods",
+                    models.IntegerField(
+                        default=0, help_text="Number of processed periods included"
+                    ),
+                ),
+                (
+                    "gross_pay",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "income_tax",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "nassit_contribution",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "net_pay",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="year_to_date",
+                        to="staff.staff",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-year"],
+                "unique_together": {("staff", "year")},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0019_payroll_year_to_date"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="staff",
+            index=models.Index(
+                fields=["last_name", "first_name", "id"], name="staff_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="staff",
+            index=models.Index(fields=["hire_date", "id"], name="staff_hire_date_idx"),
+        ),
+    ]
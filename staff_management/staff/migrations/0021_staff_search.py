@@ -0,0 +1,72 @@
+from django.db import migrations
+
+COLUMNS = {
+    "name": ["first_name", "last_name"],
+    "staff_id": ["staff_id"],
+    "email": ["email"],
+    "position": ["position"],
+    "qualifications": ["highest_qualification", "other_qualifications"],
+    "institution": ["institution"],
+    "publications": ["publications"],
+}
+PG_WEIGHTS = ["A", "A", "A", "B", "C", "C", "D"]
+
+
+def create_search_index(apps, schema_editor):
+    """Create the staff_search table for the database in use and index existing staff"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE staff_search USING fts5({', '.join(COLUMNS)}, "
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        insert = (
+            f"INSERT INTO staff_search (rowid, {', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE staff_search ("
+            "staff_id bigint PRIMARY KEY REFERENCES staff_staff (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX staff_search_document_idx ON staff_search USING GIN (document)"
+        )
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in PG_WEIGHTS
+        )
+        insert = f"INSERT INTO staff_search (staff_id, document) VALUES (%s, {vector})"
+    else:
+        return
+
+    Staff = apps.get_model("staff", "Staff")
+    fields = [field for group in COLUMNS.values() for field in group]
+    rows = []
+    for row in Staff.objects.values_list("id", *fields).iterator():
+        values = iter(row[1:])
+        rows.append(
+            (row[0],)
+            + tuple(
+                " ".join(str(next(values) or "") for field in group).strip()
+                for group in COLUMNS.values()
+            )
+        )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(insert, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE staff_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0020_staff_directory_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
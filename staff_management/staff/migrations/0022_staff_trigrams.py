@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:59
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_existing_staff(apps, schema_editor):
+    Staff = apps.get_model("staff", "Staff")
+    StaffTrigram = apps.get_model("staff", "StaffTrigram")
+    rows = []
+    for pk, staff_id, first_name, last_name in Staff.objects.values_list(
+        "id", "staff_id", "first_name", "last_name"
+    ).iterator():
+        grams = set()
+        for word in re.findall(
+            r"[^\W_]+", f"{staff_id} {first_name} {last_name}".lower()
+        ):
+            padded = f"  {word} "
+            grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+        rows.extend(StaffTrigram(staff_id=pk, trigram=gram) for gram in grams)
+    StaffTrigram.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0021_staff_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StaffTrigram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("trigram", models.CharField(max_length=3)),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trigrams",
+                        to="staff.staff",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["trigram", "staff"], name="staff_trigram_lookup_idx"
+                    )
+                ],
+                "unique_together": {("staff", "trigram")},
+            },
+        ),
+        migrations.RunPython(index_existing_staff, migrations.RunPython.noop),
+    ]
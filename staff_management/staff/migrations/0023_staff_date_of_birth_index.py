@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0022_staff_trigrams"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="staff",
+            name="date_of_birth",
+            field=models.DateField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+
+RENEWAL_YEARS = [2, 4]
+
+
+def create_milestones(apps, schema_editor):
+    """Milestones for existing staff; a set notification flag marks past 2-year milestones sent"""
+    Staff = apps.get_model("staff", "Staff")
+    ContractRenewalMilestone = apps.get_model("staff", "ContractRenewalMilestone")
+    today = timezone.localdate()
+    now = timezone.now()
+    milestones = []
+    for staff in (
+        Staff.objects.exclude(
+            employment_type__in=["part_time", "associate", "contract"]
+        )
+        .only("hire_date", "contract_start_date", "contract_renewal_notification_sent")
+        .iterator()
+    ):
+        contract_date = staff.contract_start_date or staff.hire_date
+        for years in RENEWAL_YEARS:
+            due_date = contract_date + relativedelta(years=years)
+            sent = (
+                years == 2
+                and staff.contract_renewal_notification_sent
+                and due_date <= today
+            )
+            milestones.append(
+                ContractRenewalMilestone(
+                    staff_id=staff.pk,
+                    years=years,
+                    due_date=due_date,
+                    notified_at=now if sent else None,
+                )
+            )
+    ContractRenewalMilestone.objects.bulk_create(milestones, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0023_staff_date_of_birth_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractRenewalMilestone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "years",
+                    models.PositiveSmallIntegerField(
+                        choices=[(2, "2 Years"), (4, "4 Years")]
+                    ),
+                ),
+                ("due_date", models.DateField(db_index=True)),
+                ("notified_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="renewal_milestones",
+                        to="staff.staff",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["due_date"],
+                "unique_together": {("staff", "years")},
+            },
+        ),
+        migrations.RunPython(create_milestones, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="staff",
+            name="contract_renewal_notification_sent",
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0026_announcement_deliveries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payrollrecompute",
+            name="payslips_removed",
+            field=models.IntegerField(
+                default=0,
+                help_text="Payslips deleted because the staff no longer have a salary structure",
+            ),
+        ),
+    ]
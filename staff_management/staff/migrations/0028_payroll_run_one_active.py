@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+def fail_duplicate_runs(apps, schema_editor):
+    """Keep only the newest queued or running run of each period active"""
+    PayrollRun = apps.get_model("staff", "PayrollRun")
+    seen = set()
+    runs = PayrollRun.objects.filter(status__in=["queued", "running"]).order_by(
+        "payroll_period_id", "-created_at", "-id"
+    )
+    for run in runs:
+        if run.payroll_period_id in seen:
+            run.status = "failed"
+            run.error_message = "Another run of this period was active."
+            run.save(update_fields=["status", "error_message"])
+        seen.add(run.payroll_period_id)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0027_payroll_recompute_payslips_removed"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="payrollrun",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["queued", "running"])),
+                fields=("payroll_period",),
+                name="payroll_run_one_active",
+            ),
+        ),
+    ]
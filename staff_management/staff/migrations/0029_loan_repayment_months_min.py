@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("staff", "0028_payroll_run_one_active"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="loanrecord",
+            name="repayment_months",
+            field=models.IntegerField(
+                validators=[django.core.validators.MinValueValidator(1)]
+            ),
+        ),
+    ]
@@ -1,10 +1,14 @@
+import copy
+import time
 from django.db import models
 from django.contrib.auth.models import User
-from datetime import date
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from dateutil.relativedelta import relativedelta
-from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear
 
 class School(models.Model):
     name = models.CharField(max_length=200)
@@ -32,6 +36,41 @@ class Department(models.Model):
             return f"{self.name} - {self.school.name}"
         return self.name
 
+class StaffQuerySet(models.QuerySet):
+    def retirement_due(self, months=None, today=None):
+        """Active staff whose retirement date falls in the next `months` calendar months.
+
+        Matches Staff.is_retirement_due (default: the configured notification
+        window), expressed as a date_of_birth range so it is one indexed query.
+        """
+        settings = SystemSettings.get_settings()
+        months = settings.retirement_notification_months if months is None else months
+        today = today or date.today()
+        next_month = today.replace(day=1) + relativedelta(months=1)
+        return self.filter(
+            status='active',
+            date_of_birth__gte=next_month - relativedelta(years=settings.retirement_age),
+            date_of_birth__lt=next_month + relativedelta(months=months, years=-settings.retirement_age),
+        ).order_by('date_of_birth')
+    
+    def with_age(self, today=None):
+        """Annotate `current_age` in the database instead of calling the age property per row"""
+        today = today or date.today()
+        return self.annotate(
+            birth_year=ExtractYear('date_of_birth'),
+            birth_month=ExtractMonth('date_of_birth'),
+            birth_day=ExtractDay('date_of_birth'),
+        ).annotate(
+            current_age=today.year - models.F('birth_year') - models.Case(
+                models.When(
+                    models.Q(birth_month__gt=today.month) | models.Q(birth_month=today.month, birth_day__gt=today.day),
+                    then=1,
+                ),
+                default=0,
+                output_field=models.IntegerField(),
+            ),
+        )
+
 class Staff(models.Model):
     STAFF_TYPES = [
         ('academic', 'Academic Staff'),
@@ -112,7 +151,7 @@ class Staff(models.Model):
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15)
-    date_of_birth = models.DateField()
+    date_of_birth = models.DateField(db_index=True)
     address = models.TextField()
     
     # Next of Kin Information
@@ -133,7 +172,6 @@ class Staff(models.Model):
     hire_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     contract_start_date = models.DateField(null=True, blank=True, help_text="For contract and associate staff")
-    contract_renewal_notification_sent = models.BooleanField(default=False)
     
     # Financial Information
     bank_name = models.CharField(max_length=100)
@@ -155,6 +193,16 @@ class Staff(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = StaffQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Staff directory sort keys (staff_id is already unique). Status is left out: most staff are
+            # active, and a status-leading index would be preferred over the primary key for id lookups.
+            models.Index(fields=['last_name', 'first_name', 'id'], name='staff_name_idx'),
+            models.Index(fields=['hire_date', 'id'], name='staff_hire_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.staff_id})"
 
@@ -197,25 +245,87 @@ class Staff(models.Model):
         hod = Staff.objects.filter(department=self.department, leadership_role='hod').first()
         return hod
     
+    @property
+    def contract_date(self):
+        """Start of the current contract, which is the hire date unless a contract start is recorded"""
+        return self.contract_start_date or self.hire_date
+    
+    def contract_renewal_dates(self):
+        """{years: date} of the contract anniversaries that call for a renewal notification"""
+        if self.employment_type in ['part_time', 'associate', 'contract']:
+            return {}  # These types don't get renewal notifications
+        return {years: self.contract_date + relativedelta(years=years) for years, label in ContractRenewalMilestone.YEARS}
+    
     @property
     def needs_contract_renewal_notification(self):
         """Check if contract renewal notification should be sent"""
-        if self.employment_type in ['part_time', 'associate', 'contract']:
-            return False  # These types don't get renewal notifications
-        
-        if not self.contract_start_date:
-            contract_date = self.hire_date
-        else:
-            contract_date = self.contract_start_date
-        
-        today = date.today()
-        years_since_contract = (today - contract_date).days / 365.25
+        return self.renewal_milestones.due().exists()
+
+class StaffTrigram(models.Model):
+    """One trigram of a staff member's staff ID or name, for typo-tolerant lookup"""
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+    
+    class Meta:
+        unique_together = ['staff', 'trigram']
+        indexes = [models.Index(fields=['trigram', 'staff'], name='staff_trigram_lookup_idx')]
+    
+    def __str__(self):
+        return f"{self.staff_id}: {self.trigram}"
+
+class ContractRenewalMilestoneQuerySet(models.QuerySet):
+    def due(self, today=None):
+        """Unsent milestones of active staff reached within the last GRACE_PERIOD"""
+        today = today or date.today()
+        return self.filter(
+            notified_at__isnull=True,
+            due_date__range=(today - ContractRenewalMilestone.GRACE_PERIOD, today),
+            staff__status='active',
+        ).select_related('staff__department').order_by('due_date', 'staff_id')
+
+class ContractRenewalMilestone(models.Model):
+    """A contract anniversary at which the staff member and HRMOs are told the contract is due for renewal"""
+    YEARS = [
+        (2, '2 Years'),
+        (4, '4 Years'),
+    ]
+    # How long after the due date a missed check still sends the notification
+    GRACE_PERIOD = timedelta(days=36)
+    
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='renewal_milestones')
+    years = models.PositiveSmallIntegerField(choices=YEARS)
+    due_date = models.DateField(db_index=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = ContractRenewalMilestoneQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['due_date']
+        unique_together = ['staff', 'years']
+    
+    def __str__(self):
+        return f"{self.staff.full_name} - {self.years} years ({self.due_date})"
+    
+    @classmethod
+    def sync(cls, staff):
+        """Bring a staff member's milestones in line with their contract date and employment type.
         
-        # Check if 2 years or 4 years have passed and notification not sent
-        if ((years_since_contract >= 2 and years_since_contract < 2.1 and not self.contract_renewal_notification_sent) or 
-           (years_since_contract >= 4 and years_since_contract < 4.1)):
-            return True
-        return False
+        A milestone whose date moves (a new contract) becomes unsent again. Milestones
+        that no longer apply are deleted unless already sent, which are kept as history.
+        """
+        wanted = staff.contract_renewal_dates()
+        existing = {milestone.years: milestone for milestone in cls.objects.filter(staff=staff)}
+        cls.objects.filter(
+            pk__in=[milestone.pk for years, milestone in existing.items() if years not in wanted and not milestone.notified_at]
+        ).delete()
+        for years, due_date in wanted.items():
+            milestone = existing.get(years)
+            if milestone is None:
+                cls.objects.create(staff=staff, years=years, due_date=due_date)
+            elif milestone.due_date != due_date:
+                milestone.due_date = due_date
+                milestone.notified_at = None
+                milestone.save(update_fields=['due_date', 'notified_at'])
 
 class StaffGrade(models.Model):
     """Editable staff grades/scales"""
@@ -235,6 +345,8 @@ class StaffGrade(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name}"
 
+_settings_memo = {}
+
 class SystemSettings(models.Model):
     """System-wide settings"""
     retirement_age = models.IntegerField(default=65, help_text="Retirement age in years")
@@ -249,11 +361,36 @@ class SystemSettings(models.Model):
     def __str__(self):
         return f"Retirement Age: {self.retirement_age} years"
     
+    CACHE_KEY = 'system-settings'
+    # Longest a process keeps its copy without re-reading the shared cache, for processes
+    # that do not serve requests (management commands, payroll workers)
+    MEMO_TIMEOUT = 60
+    
     @classmethod
     def get_settings(cls):
-        """Get or create system settings"""
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
+        """Get or create system settings.
+        
+        Memoized per process (cleared when each request starts) on top of a
+        shared cache entry, which a save deletes so other workers reload it.
+        Returns a copy, so callers may modify and save it.
+        """
+        memo = _settings_memo.get('settings')
+        if memo is None or time.monotonic() - memo[1] > cls.MEMO_TIMEOUT:
+            from django.core.cache import cache
+            settings = cache.get(cls.CACHE_KEY)
+            if settings is None:
+                settings, created = cls.objects.get_or_create(pk=1)
+                cache.set(cls.CACHE_KEY, settings, None)
+            memo = _settings_memo['settings'] = (settings, time.monotonic())
+        return copy.copy(memo[0])
+    
+    @classmethod
+    def clear_cache(cls, shared=False):
+        """Forget this process's copy, and the shared cache entry too if `shared`"""
+        _settings_memo.clear()
+        if shared:
+            from django.core.cache import cache
+            cache.delete(cls.CACHE_KEY)
 
 class Announcement(models.Model):
     """Announcements and letters to staff"""
@@ -308,6 +445,39 @@ class Announcement(models.Model):
             staff_queryset = staff_queryset.filter(department__in=self.specific_departments.all())
         
         return staff_queryset
+    
+    def create_deliveries(self):
+        """One pending AnnouncementDelivery per targeted staff member with an email address"""
+        recipients = self.get_target_staff().exclude(email='').values_list('id', 'email')
+        deliveries = AnnouncementDelivery.objects.bulk_create(
+            [AnnouncementDelivery(announcement=self, staff_id=staff_id, email=email) for staff_id, email in recipients],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        return len(deliveries)
+
+class AnnouncementDelivery(models.Model):
+    """Email delivery of an announcement to one recipient"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='deliveries')
+    staff = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True, related_name='announcement_deliveries')
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['announcement', 'email']
+        indexes = [models.Index(fields=['announcement', 'status'], name='announcement_delivery_idx')]
+    
+    def __str__(self):
+        return f"{self.announcement.title} -> {self.email} ({self.get_status_display()})"
 
 class HRMO(models.Model):
     """Human Resource Management Officer"""
@@ -331,6 +501,7 @@ class Leave(models.Model):
         ('paternity', 'Paternity Leave'),
         ('study', 'Study Leave'),
         ('emergency', 'Emergency Leave'),
+        ('unpaid', 'Unpaid Leave'),
     ]
     
     STATUS_CHOICES = [
@@ -377,12 +548,11 @@ class Leave(models.Model):
             Please log in to the system to review and approve/reject this application.
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 hrmo_emails,
-                fail_silently=True,
             )
     
     def send_approval_notification(self):
@@ -424,12 +594,11 @@ class Leave(models.Model):
                 Human Resources
                 '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [self.staff.email],
-                fail_silently=True,
             )
 
 class Promotion(models.Model):
@@ -480,12 +649,11 @@ class Promotion(models.Model):
             Please log in to the system to review and approve/reject this promotion.
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 hrmo_emails,
-                fail_silently=True,
             )
     
     def send_approval_notification(self):
@@ -525,12 +693,11 @@ class Promotion(models.Model):
                 Human Resources
                 '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [self.staff.email],
-                fail_silently=True,
             )
 
 class Retirement(models.Model):
@@ -569,12 +736,11 @@ class Retirement(models.Model):
             Please ensure all necessary retirement procedures are completed.
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 hrmo_emails,
-                fail_silently=True,
             )
         
         # Send to staff
@@ -599,12 +765,11 @@ class Retirement(models.Model):
             Human Resources
             '''
             
-            send_mail(
+            OutboundEmail.queue(
                 subject,
                 message,
                 settings.DEFAULT_FROM_EMAIL,
                 [self.staff.email],
-                fail_silently=True,
             )
         
         self.notification_sent = True
@@ -685,6 +850,27 @@ class SalaryStructure(models.Model):
     def gross_salary(self):
         return self.basic_salary + self.housing_allowance + self.transport_allowance + self.medical_allowance + self.other_allowances
 
+class StatutoryBracket(models.Model):
+    """One band of an effective-dated income tax or NASSIT table, applied to monthly basic salary"""
+    SCHEMES = [
+        ('income_tax', 'Income Tax'),
+        ('nassit', 'NASSIT'),
+    ]
+    
+    scheme = models.CharField(max_length=20, choices=SCHEMES)
+    effective_from = models.DateField(db_index=True, help_text="Applies to periods ending on or after this date, until a later table takes over")
+    lower_bound = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    upper_bound = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Blank for an open top band; set it on the top band to cap the contribution")
+    rate = models.DecimalField(max_digits=5, decimal_places=2, help_text="Percentage of the salary between the bounds")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['scheme', '-effective_from', 'lower_bound']
+    
+    def __str__(self):
+        upper = self.upper_bound if self.upper_bound is not None else 'and above'
+        return f"{self.get_scheme_display()} from {self.effective_from}: {self.lower_bound} - {upper} at {self.rate}%"
+
 class PayrollPeriod(models.Model):
     """Payroll processing periods"""
     name = models.CharField(max_length=100)
@@ -718,6 +904,7 @@ class Payslip(models.Model):
     income_tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     nassit_contribution = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     loan_deduction = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    benefit_deduction = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     other_deductions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     # Leave deductions
@@ -745,18 +932,143 @@ class Payslip(models.Model):
     def __str__(self):
         return f"{self.staff.full_name} - {self.payroll_period.name}"
     
+    EARNING_COMPONENTS = [
+        'basic_salary', 'housing_allowance', 'transport_allowance',
+        'medical_allowance', 'other_allowances', 'overtime_pay',
+    ]
+    DEDUCTION_COMPONENTS = [
+        'income_tax', 'nassit_contribution', 'loan_deduction', 'benefit_deduction',
+        'other_deductions', 'unpaid_leave_deduction',
+    ]
+    
     def calculate_totals(self):
         """Calculate gross pay, total deductions, and net pay"""
-        self.gross_pay = (
-            self.basic_salary + self.housing_allowance + self.transport_allowance + 
-            self.medical_allowance + self.other_allowances + self.overtime_pay
-        )
-        self.total_deductions = (
-            self.income_tax + self.nassit_contribution + self.loan_deduction + 
-            self.other_deductions + self.unpaid_leave_deduction
-        )
+        self.gross_pay = sum(getattr(self, field) for field in self.EARNING_COMPONENTS)
+        self.total_deductions = sum(getattr(self, field) for field in self.DEDUCTION_COMPONENTS)
         self.net_pay = self.gross_pay - self.total_deductions
 
+class PayrollRun(models.Model):
+    """Background payroll run, checkpointed after each department"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('completed', 'Completed'),
+    ]
+    STALE_AFTER = timedelta(minutes=10)
+    
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.CASCADE, related_name='runs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    started_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    total_departments = models.IntegerField(default=0)
+    completed_departments = models.IntegerField(default=0)
+    last_department_id = models.BigIntegerField(null=True, blank=True, help_text="Checkpoint: departments up to this id are written")
+    payslips_written = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one queued or running run per period, however many requests start one
+            models.UniqueConstraint(
+                fields=['payroll_period'], condition=models.Q(status__in=['queued', 'running']),
+                name='payroll_run_one_active',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.payroll_period.name} - {self.get_status_display()}"
+    
+    @property
+    def progress_percent(self):
+        if self.status == 'completed':
+            return 100
+        if not self.total_departments:
+            return 0
+        return int(self.completed_departments * 100 / self.total_departments)
+    
+    @property
+    def is_stale(self):
+        """A queued or running job that stopped checkpointing has most likely died"""
+        return self.status in ['queued', 'running'] and timezone.now() - self.updated_at > self.STALE_AFTER
+    
+    @property
+    def can_resume(self):
+        return self.status == 'failed' or self.is_stale
+
+class PayrollRecompute(models.Model):
+    """Incremental recomputation of an open period after one of its inputs changed"""
+    TRIGGER_TYPES = [
+        ('salary_structure', 'Salary Structure'),
+        ('loan', 'Loan Approval'),
+    ]
+    
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.CASCADE, related_name='recomputes')
+    trigger_type = models.CharField(max_length=20, choices=TRIGGER_TYPES)
+    trigger_id = models.PositiveIntegerField(help_text="Primary key of the salary structure or loan that changed")
+    description = models.CharField(max_length=255)
+    staff_affected = models.IntegerField(default=0)
+    payslips_updated = models.IntegerField(default=0)
+    payslips_removed = models.IntegerField(default=0, help_text="Payslips deleted because the staff no longer have a salary structure")
+    preview_patched = models.BooleanField(default=False, help_text="Cached preview was updated in place")
+    triggered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.payroll_period.name} - {self.description}"
+
+class PayrollSummary(models.Model):
+    """Totals for a processed period along one reporting dimension, written at close"""
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('department', 'Department'),
+        ('school', 'School'),
+        ('grade', 'Grade'),
+        ('employment_type', 'Employment Type'),
+    ]
+    
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.CASCADE, related_name='summaries')
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    key = models.CharField(max_length=50, blank=True, help_text="Id or code of the group; blank when unassigned")
+    label = models.CharField(max_length=200)
+    headcount = models.IntegerField(default=0)
+    gross_pay = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_pay = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['dimension', 'label']
+        unique_together = ['payroll_period', 'dimension', 'key']
+    
+    def __str__(self):
+        return f"{self.payroll_period.name} - {self.get_dimension_display()}: {self.label}"
+
+class PayrollYearToDate(models.Model):
+    """Running totals of a staff member's processed payslips for a calendar year"""
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='year_to_date')
+    year = models.IntegerField()
+    periods = models.IntegerField(default=0, help_text="Number of processed periods included")
+    gross_pay = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nassit_contribution = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_pay = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-year']
+        unique_together = ['staff', 'year']
+    
+    def __str__(self):
+        return f"{self.staff.full_name} - {self.year}"
+
 class LeaveBalance(models.Model):
     """Track leave balances for staff"""
     staff = models.OneToOneField(Staff, on_delete=models.CASCADE)
@@ -826,6 +1138,25 @@ class StaffBenefit(models.Model):
             return self.employee_contribution_override
         return self.benefit_plan.employee_contribution
 
+class PayrollBenefitCost(models.Model):
+    """Employee and employer contributions to one benefit plan in a processed period"""
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.CASCADE, related_name='benefit_costs')
+    benefit_plan = models.ForeignKey(BenefitPlan, on_delete=models.CASCADE, related_name='period_costs')
+    enrolled_staff = models.IntegerField(default=0)
+    employee_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    employer_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['benefit_plan__name']
+        unique_together = ['payroll_period', 'benefit_plan']
+    
+    def __str__(self):
+        return f"{self.payroll_period.name} - {self.benefit_plan.name}"
+    
+    @property
+    def total_cost(self):
+        return self.employee_total + self.employer_total
+
 class LoanRecord(models.Model):
     """Staff loan records for payroll deductions"""
     LOAN_TYPES = [
@@ -848,7 +1179,7 @@ class LoanRecord(models.Model):
     loan_type = models.CharField(max_length=20, choices=LOAN_TYPES)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    repayment_months = models.IntegerField()
+    repayment_months = models.IntegerField(validators=[MinValueValidator(1)])
     monthly_deduction = models.DecimalField(max_digits=12, decimal_places=2)
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     balance = models.DecimalField(max_digits=12, decimal_places=2)
@@ -878,6 +1209,60 @@ class LoanRecord(models.Model):
         
         self.balance = self.amount
         return self.monthly_deduction
+    
+    def generate_schedule(self):
+        """Replace the unpaid part of the amortization schedule, one installment per month.
+        
+        Principal and interest are spread evenly (flat interest, as in
+        calculate_monthly_payment); the last installment absorbs rounding.
+        """
+        cent = Decimal('0.01')
+        months = self.repayment_months
+        if months < 1:
+            raise ValueError('A loan must be repaid over at least one month')
+        paid = self.installments.filter(is_paid=True).count()
+        self.installments.filter(is_paid=False).delete()
+        
+        total_interest = (self.amount * self.interest_rate / 100).quantize(cent, rounding=ROUND_HALF_UP)
+        principal = (self.amount / months).quantize(cent, rounding=ROUND_HALF_UP)
+        interest = (total_interest / months).quantize(cent, rounding=ROUND_HALF_UP)
+        
+        installments = []
+        balance = self.balance
+        for number in range(paid + 1, months + 1):
+            if number == months:
+                principal = balance
+                interest = total_interest - interest * (months - 1)
+            balance -= principal
+            installments.append(LoanInstallment(
+                loan=self,
+                installment_number=number,
+                due_date=self.start_deduction_date + relativedelta(months=number - 1),
+                principal=principal,
+                interest=interest,
+                amount=principal + interest,
+                balance_after=balance,
+            ))
+        return LoanInstallment.objects.bulk_create(installments)
+
+class LoanInstallment(models.Model):
+    """One scheduled monthly repayment of a loan, posted when its payroll period closes"""
+    loan = models.ForeignKey(LoanRecord, on_delete=models.CASCADE, related_name='installments')
+    installment_number = models.IntegerField()
+    due_date = models.DateField(db_index=True)
+    principal = models.DecimalField(max_digits=12, decimal_places=2)
+    interest = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, help_text="Outstanding principal once paid")
+    is_paid = models.BooleanField(default=False)
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.SET_NULL, null=True, blank=True, related_name='loan_installments')
+    
+    class Meta:
+        ordering = ['loan', 'installment_number']
+        unique_together = ['loan', 'installment_number']
+    
+    def __str__(self):
+        return f"{self.loan} - installment {self.installment_number}"
 
 class Notification(models.Model):
     """System notifications for workflow events"""
@@ -920,6 +1305,46 @@ class Notification(models.Model):
             object_id=object_id
         )
 
+class OutboundEmail(models.Model):
+    """An email waiting in the outbox for the send_outbox worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField(help_text="One address per line")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+    
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+    
+    @property
+    def recipient_list(self):
+        return self.recipients.split()
+    
+    @classmethod
+    def queue(cls, subject, message, from_email, recipient_list):
+        """Queue an email for the send_outbox worker; takes the same arguments as send_mail"""
+        return cls.objects.create(
+            subject=subject,
+            body=message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients='\n'.join(recipient_list),
+        )
+
 class PerformanceReview(models.Model):
     """Performance review records"""
     STATUS_CHOICES = [
@@ -0,0 +1,110 @@
+"""Delivery of the email outbox.
+
+Notification helpers queue messages with OutboundEmail.queue() rather than
+talking to the mail server inside a request. The send_outbox command claims
+due messages in batches and sends them over one open connection, reopening
+it only after a connection-level error. A failed message is retried with
+exponential backoff, except that a permanent (5xx) refusal fails it at once.
+
+Claiming a batch moves its next_attempt_at forward by LEASE, so a worker
+that dies mid-batch leaves the unsent messages to be picked up again. Rows
+are claimed with SKIP LOCKED where the database has it; SQLite has no row
+locks, so run a single worker there.
+"""
+import smtplib
+from datetime import timedelta
+
+from django.db import connection as db_connection, transaction
+from django.core.mail import EmailMessage
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 6
+LEASE = timedelta(minutes=10)
+# Delay before the first retry, doubled for every further attempt
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+# Errors about the message itself; anything else leaves the connection unusable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def is_permanent(error):
+    """True for refusals the server says will not succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, reason in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def claim_batch(size=BATCH_SIZE):
+    """Due messages, leased to this worker"""
+    now = timezone.now()
+    queryset = OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+    with transaction.atomic():
+        if db_connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset.order_by('next_attempt_at', 'id')[:size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now + LEASE)
+    return batch
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= MAX_ATTEMPTS or is_permanent(error):
+        email.status = 'failed'
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver(batch, connection):
+    """Send claimed messages over a mail backend connection; returns (sent, failed).
+
+    Each message's outcome is saved as soon as it is known, so a crash never
+    causes a delivered message to be sent again. If the server cannot be
+    reached at all, the rest of the batch is put back without using up an
+    attempt and the error is raised.
+    """
+    sent = failed = 0
+    is_open = False
+    for position, email in enumerate(batch):
+        if not is_open:
+            try:
+                connection.open()
+            except (smtplib.SMTPException, OSError):
+                OutboundEmail.objects.filter(pk__in=[email.pk for email in batch[position:]]).update(
+                    next_attempt_at=timezone.now() + RETRY_DELAY,
+                )
+                raise
+            is_open = True
+        try:
+            EmailMessage(email.subject, email.body, email.from_email, email.recipient_list, connection=connection).send()
+        except (smtplib.SMTPException, OSError) as error:
+            record_failure(email, error)
+            failed += 1
+            if not isinstance(error, MESSAGE_ERRORS):
+                connection.close()
+                is_open = False
+            continue
+        email.attempts += 1
+        email.status = 'sent'
+        email.sent_at = timezone.now()
+        email.last_error = ''
+        email.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+        sent += 1
+    return sent, failed
+
+
+def send_batch(connection, size=BATCH_SIZE):
+    """Claim and deliver one batch; returns (sent, failed)"""
+    batch = claim_batch(size)
+    if not batch:
+        return 0, 0
+    return deliver(batch, connection)
@@ -0,0 +1,897 @@
+"""Set-based payroll engine.
+
+A period's inputs are loaded in a few grouped queries and every payslip is
+computed in memory (statutory deductions in one NumPy pass, see statutory)
+and results are written back in bulk. Previews are cached under a signature of their inputs; a
+changed salary structure or loan recomputes only the staff it applies to.
+Background runs checkpoint per department, and closing a period posts loan
+repayments and writes the summary, benefit cost and year-to-date rows.
+"""
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, When
+from django.utils import timezone
+import numpy as np
+
+from .models import (
+    Staff, Leave, SalaryStructure, LoanRecord, LoanInstallment, Payslip, PayrollPeriod, PayrollRun, PayrollRecompute,
+    PayrollSummary, PayrollYearToDate, StaffBenefit, PayrollBenefitCost,
+)
+from .payslip_pdf import purge_cached_payslips
+from .statutory import SCHEMES, default_tables, evaluate, evaluate_scalar, load_tables, to_cents
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+BULK_BATCH_SIZE = 500
+PREVIEW_CACHE_TIMEOUT = 60 * 60
+SHARD_MODES = ['department', 'id']
+
+EARNING_FIELDS = [
+    'basic_salary', 'housing_allowance', 'transport_allowance',
+    'medical_allowance', 'other_allowances',
+]
+STAFF_FIELDS = ['id', 'department_id', 'staff_category', 'staff_grade', 'employment_type']
+
+# Reporting dimension -> (payslip key field, label field or choices)
+SUMMARY_DIMENSIONS = {
+    'department': ('staff__department_id', 'staff__department__name'),
+    'school': ('staff__department__school_id', 'staff__department__school__name'),
+    'grade': ('staff__staff_grade', dict(Staff.GRADE_CHOICES)),
+    'employment_type': ('staff__employment_type', dict(Staff.EMPLOYMENT_TYPES)),
+}
+
+# Fields written by the engine; approval and delivery flags are left untouched
+MONEY_FIELDS = (
+    Payslip.EARNING_COMPONENTS + Payslip.DEDUCTION_COMPONENTS
+    + ['gross_pay', 'total_deductions', 'net_pay']
+)
+COUNT_FIELDS = ['unpaid_leave_days']
+PAYSLIP_FIELDS = MONEY_FIELDS + COUNT_FIELDS
+
+# Payslip fields accumulated into PayrollYearToDate
+YEAR_TO_DATE_FIELDS = ['gross_pay', 'income_tax', 'nassit_contribution', 'total_deductions', 'net_pay']
+
+
+def money(value):
+    """Round a Decimal to cents the way the DecimalFields store it"""
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def structure_key(row):
+    """Salary structures are matched on (category, grade, employment type)"""
+    return (row['staff_category'], row['staff_grade'], row['employment_type'])
+
+
+def load_salary_structures():
+    """Map each structure key to the earnings of the active salary structure"""
+    rows = SalaryStructure.objects.filter(is_active=True).values(
+        'staff_category', 'staff_grade', 'employment_type', *EARNING_FIELDS
+    )
+    return {structure_key(row): row for row in rows}
+
+
+def period_installments(period):
+    """Scheduled installments of active loans that fall due in the period.
+
+    Unpaid installments that fell due earlier are carried forward (a member of
+    staff who was not paid in a closed period still owes them), unless another
+    open period covers their due date and will collect them itself.
+    """
+    other_open = PayrollPeriod.objects.filter(
+        is_processed=False,
+        start_date__lte=OuterRef('due_date'),
+        end_date__gte=OuterRef('due_date'),
+    ).exclude(pk=period.pk)
+    return LoanInstallment.objects.filter(
+        Q(due_date__gte=period.start_date) | Q(is_paid=False) & ~Exists(other_open),
+        loan__status='active',
+        due_date__lte=period.end_date,
+    )
+
+
+def load_loan_deductions(period):
+    """Sum the loan installments due in the period, arrears included, per staff member"""
+    rows = period_installments(period).values('loan__staff_id').annotate(total=Sum('amount'))
+    return {row['loan__staff_id']: row['total'] for row in rows}
+
+
+def active_enrollments(period):
+    """Benefit enrollments in force for the period, with the employee contribution
+    resolved as StaffBenefit.monthly_contribution does (a zero override falls back
+    to the plan's contribution)"""
+    return StaffBenefit.objects.filter(
+        is_active=True,
+        benefit_plan__is_active=True,
+        enrollment_date__lte=period.end_date,
+    ).annotate(contribution=Case(
+        When(
+            Q(employee_contribution_override__isnull=False) & ~Q(employee_contribution_override=0),
+            then=F('employee_contribution_override'),
+        ),
+        default=F('benefit_plan__employee_contribution'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))
+
+
+def load_benefit_deductions(period):
+    """Sum the employee benefit contributions per staff member"""
+    rows = active_enrollments(period).values('staff_id').annotate(total=Sum('contribution'))
+    return {row['staff_id']: row['total'] for row in rows}
+
+
+def period_days(period):
+    return (period.end_date - period.start_date).days + 1
+
+
+def merged_days(intervals, start, end):
+    """Days covered by the union of (start, end) date intervals, clipped to [start, end].
+
+    `intervals` must be sorted by start date; days covered by overlapping
+    leave records are counted once.
+    """
+    days = 0
+    current_start = current_end = None
+    for interval_start, interval_end in intervals:
+        interval_start, interval_end = max(interval_start, start), min(interval_end, end)
+        if interval_start > interval_end:
+            continue
+        if current_end is not None and interval_start <= current_end + timedelta(days=1):
+            current_end = max(current_end, interval_end)
+            continue
+        if current_end is not None:
+            days += (current_end - current_start).days + 1
+        current_start, current_end = interval_start, interval_end
+    if current_end is not None:
+        days += (current_end - current_start).days + 1
+    return days
+
+
+def load_unpaid_leave_days(period):
+    """Days of approved unpaid leave inside the period, per staff member"""
+    rows = Leave.objects.filter(
+        leave_type='unpaid',
+        status='approved',
+        start_date__lte=period.end_date,
+        end_date__gte=period.start_date,
+    ).order_by('staff_id', 'start_date').values_list('staff_id', 'start_date', 'end_date')
+
+    intervals = defaultdict(list)
+    for staff_id, start_date, end_date in rows:
+        intervals[staff_id].append((start_date, end_date))
+    return {
+        staff_id: merged_days(staff_intervals, period.start_date, period.end_date)
+        for staff_id, staff_intervals in intervals.items()
+    }
+
+
+class PayrollInputs:
+    """Everything needed to compute a period's payslips, loaded up front"""
+
+    def __init__(self, period_id, staff, structures, loan_deductions, benefit_deductions=None, brackets=None,
+                 unpaid_leave_days=None, period_days=30):
+        # Everything here must stay picklable; shards are sent to worker processes
+        self.period_id = period_id
+        self.staff = staff
+        self.structures = structures
+        self.loan_deductions = loan_deductions
+        self.benefit_deductions = benefit_deductions or {}
+        self.brackets = brackets or default_tables()
+        self.unpaid_leave_days = unpaid_leave_days or {}
+        self.period_days = period_days
+        self._signature = None
+
+    @classmethod
+    def load(cls, period, staff_queryset=None):
+        if staff_queryset is None:
+            staff_queryset = Staff.objects.filter(status='active')
+        staff = list(staff_queryset.order_by('id').values(*STAFF_FIELDS))
+        return cls(
+            period.id,
+            staff,
+            load_salary_structures(),
+            load_loan_deductions(period),
+            load_benefit_deductions(period),
+            load_tables(period.end_date),
+            load_unpaid_leave_days(period),
+            period_days(period),
+        )
+
+    def signature(self):
+        """Hash of every input value, used to tell whether a cached preview is still valid"""
+        if self._signature is None:
+            payload = json.dumps([
+                self.period_id,
+                self.staff,
+                sorted(self.structures.items()),
+                sorted(self.loan_deductions.items()),
+                sorted(self.benefit_deductions.items()),
+                sorted(self.brackets.items()),
+                sorted(self.unpaid_leave_days.items()),
+                self.period_days,
+            ], default=str, sort_keys=True)
+            self._signature = hashlib.sha256(payload.encode()).hexdigest()
+        return self._signature
+
+    def for_staff(self, staff):
+        """Inputs restricted to a subset of staff rows, sharing the lookups"""
+        return PayrollInputs(
+            self.period_id, staff, self.structures, self.loan_deductions, self.benefit_deductions, self.brackets,
+            self.unpaid_leave_days, self.period_days,
+        )
+
+    def by_department(self):
+        """Split into per-department chunks, in ascending department id order"""
+        rows = sorted(self.staff, key=lambda row: (row['department_id'], row['id']))
+        return [
+            (department_id, self.for_staff(list(group)))
+            for department_id, group in groupby(rows, key=lambda row: row['department_id'])
+        ]
+
+    def shard(self, count, shard_by='department'):
+        """Split into at most `count` shards of roughly equal staff size.
+
+        Department sharding keeps each department in one shard and gives the
+        largest departments to the lightest shard first; id sharding cuts the
+        id-ordered staff list into contiguous ranges.
+        """
+        count = max(1, min(count, len(self.staff)))
+        if shard_by == 'id':
+            size = -(-len(self.staff) // count)
+            return [self.for_staff(self.staff[i:i + size]) for i in range(0, len(self.staff), size)]
+
+        shards = [[] for _ in range(count)]
+        departments = sorted(self.by_department(), key=lambda item: len(item[1].staff), reverse=True)
+        for department_id, chunk in departments:
+            min(shards, key=len).extend(chunk.staff)
+        return [self.for_staff(rows) for rows in shards if rows]
+
+
+def payslip_values(staff, structure, inputs, income_tax, nassit_contribution):
+    """Payslip field values for one staff row from its structure and statutory deductions"""
+    # Unpaid leave is pro-rated from the basic salary over the period's calendar days
+    unpaid_days = inputs.unpaid_leave_days.get(staff['id'], 0)
+    values = {field: structure[field] for field in EARNING_FIELDS}
+    values.update({
+        'overtime_pay': ZERO,
+        'income_tax': income_tax,
+        'nassit_contribution': nassit_contribution,
+        'loan_deduction': money(inputs.loan_deductions.get(staff['id'], ZERO)),
+        'benefit_deduction': money(inputs.benefit_deductions.get(staff['id'], ZERO)),
+        'other_deductions': ZERO,
+        'unpaid_leave_days': unpaid_days,
+        'unpaid_leave_deduction': money(structure['basic_salary'] * unpaid_days / inputs.period_days),
+    })
+    values['gross_pay'] = sum(values[field] for field in Payslip.EARNING_COMPONENTS)
+    values['total_deductions'] = sum(values[field] for field in Payslip.DEDUCTION_COMPONENTS)
+    values['net_pay'] = values['gross_pay'] - values['total_deductions']
+    return values
+
+
+def calculate_payslip(staff, inputs):
+    """Reference path for one staff row, or None without a salary structure.
+
+    compute_payslips must produce exactly the same values.
+    """
+    structure = inputs.structures.get(structure_key(staff))
+    if structure is None:
+        return None
+    basic_salary = structure['basic_salary']
+    return payslip_values(
+        staff, structure, inputs,
+        income_tax=evaluate_scalar(basic_salary, inputs.brackets['income_tax']),
+        nassit_contribution=evaluate_scalar(basic_salary, inputs.brackets['nassit']),
+    )
+
+
+def compute_payslips(inputs):
+    """Compute every payslip in memory, keyed by staff id.
+
+    Statutory deductions are evaluated for the whole batch in one NumPy pass
+    per scheme over the basic salaries in cents.
+    """
+    rows = []
+    for staff in inputs.staff:
+        structure = inputs.structures.get(structure_key(staff))
+        if structure is not None:
+            rows.append((staff, structure))
+    if not rows:
+        return {}
+
+    basic_cents = {key: to_cents(structure['basic_salary']) for key, structure in inputs.structures.items()}
+    base = np.fromiter((basic_cents[structure_key(staff)] for staff, structure in rows), dtype=np.int64, count=len(rows))
+    deductions = {
+        scheme: [Decimal(cents).scaleb(-2) for cents in evaluate(base, inputs.brackets[scheme]).tolist()]
+        for scheme in SCHEMES
+    }
+
+    payslips = {}
+    for i, (staff, structure) in enumerate(rows):
+        payslips[staff['id']] = payslip_values(
+            staff, structure, inputs,
+            income_tax=deductions['income_tax'][i],
+            nassit_contribution=deductions['nassit'][i],
+        )
+    return payslips
+
+
+def _encode_payslips(payslips):
+    """Payslip values as integers (amounts in cents), which pickle far faster than Decimals"""
+    return [
+        (staff_id, tuple(int(values[field] * 100) for field in MONEY_FIELDS)
+         + tuple(values[field] for field in COUNT_FIELDS))
+        for staff_id, values in payslips.items()
+    ]
+
+
+def _decode_payslips(rows):
+    payslips = {}
+    for staff_id, row in rows:
+        values = {field: Decimal(cents).scaleb(-2) for field, cents in zip(MONEY_FIELDS, row)}
+        values.update(zip(COUNT_FIELDS, row[len(MONEY_FIELDS):]))
+        payslips[staff_id] = values
+    return payslips
+
+
+def _compute_shard(inputs):
+    """Process pool task"""
+    return _encode_payslips(compute_payslips(inputs))
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def compute_payslips_parallel(inputs, workers, shard_by='department'):
+    """Compute payslips across a process pool; same result as compute_payslips.
+
+    Opt-in only: on a single CPU the pool is slower than compute_payslips.
+    """
+    shards = inputs.shard(workers, shard_by)
+    if len(shards) <= 1:
+        return compute_payslips(inputs)
+
+    payslips = {}
+    with ProcessPoolExecutor(max_workers=len(shards), initializer=_init_worker) as executor:
+        for rows in executor.map(_compute_shard, shards):
+            payslips.update(_decode_payslips(rows))
+    return payslips
+
+
+def preview_cache_key(period):
+    return f'payroll_preview:{period.id}'
+
+
+def cached_payslips(period, inputs):
+    """Payslips from the period's cached preview, if computed from identical inputs"""
+    cached = cache.get(preview_cache_key(period))
+    if cached and cached['signature'] == inputs.signature():
+        return _decode_payslips(cached['rows'])
+    return None
+
+
+def cache_payslips(period, inputs, payslips):
+    cache.set(
+        preview_cache_key(period),
+        {'signature': inputs.signature(), 'rows': _encode_payslips(payslips)},
+        PREVIEW_CACHE_TIMEOUT,
+    )
+
+
+def preview_payroll(period):
+    """Compute the period in memory, without writing payslips.
+
+    Returns per-staff gross, deductions and net, totals by department and
+    grade, and deltas against the previous processed period.
+    """
+    inputs = PayrollInputs.load(period)
+    payslips = cached_payslips(period, inputs)
+    if payslips is None:
+        payslips = compute_payslips(inputs)
+        cache_payslips(period, inputs, payslips)
+
+    staff_info = {
+        row['id']: row for row in Staff.objects.filter(status='active').values(
+            'id', 'staff_id', 'first_name', 'last_name', 'staff_grade', 'department__name',
+        )
+    }
+    previous_period = PayrollPeriod.objects.filter(
+        is_processed=True, start_date__lt=period.start_date,
+    ).order_by('-start_date').first()
+    previous = {}
+    if previous_period:
+        previous = {
+            row['staff_id']: row for row in Payslip.objects.filter(payroll_period=previous_period).values(
+                'staff_id', 'gross_pay', 'total_deductions', 'net_pay',
+            )
+        }
+
+    def empty_totals():
+        return {'headcount': 0, 'gross_pay': ZERO, 'total_deductions': ZERO, 'net_pay': ZERO}
+
+    rows = []
+    totals = empty_totals()
+    by_department = defaultdict(empty_totals)
+    by_grade = defaultdict(empty_totals)
+    for staff_id, values in payslips.items():
+        info = staff_info.get(staff_id, {})
+        before = previous.get(staff_id)
+        rows.append({
+            'staff_id': info.get('staff_id'),
+            'name': f"{info.get('first_name', '')} {info.get('last_name', '')}".strip(),
+            'department': info.get('department__name'),
+            'grade': info.get('staff_grade'),
+            'gross_pay': values['gross_pay'],
+            'total_deductions': values['total_deductions'],
+            'net_pay': values['net_pay'],
+            'previous_net_pay': before['net_pay'] if before else None,
+            'net_pay_delta': values['net_pay'] - before['net_pay'] if before else None,
+        })
+        for group in (totals, by_department[info.get('department__name')], by_grade[info.get('staff_grade')]):
+            group['headcount'] += 1
+            group['gross_pay'] += values['gross_pay']
+            group['total_deductions'] += values['total_deductions']
+            group['net_pay'] += values['net_pay']
+
+    previous_totals = {
+        'headcount': len(previous),
+        'gross_pay': sum((row['gross_pay'] for row in previous.values()), ZERO),
+        'total_deductions': sum((row['total_deductions'] for row in previous.values()), ZERO),
+        'net_pay': sum((row['net_pay'] for row in previous.values()), ZERO),
+    }
+    rows.sort(key=lambda row: (row['department'] or '', row['name']))
+    return {
+        'period': period,
+        'signature': inputs.signature(),
+        'rows': rows,
+        'totals': totals,
+        'by_department': sorted(by_department.items(), key=lambda item: item[0] or ''),
+        'by_grade': sorted(by_grade.items(), key=lambda item: item[0] or ''),
+        'previous_period': previous_period,
+        'previous_totals': previous_totals,
+        'totals_delta': {key: totals[key] - previous_totals[key] for key in totals},
+        'new_staff': [row for row in rows if previous_period and row['previous_net_pay'] is None],
+        'changed_staff': [row for row in rows if row['net_pay_delta']],
+        'dropped_staff_count': len(set(previous) - set(payslips)),
+    }
+
+
+def existing_payslip_ids(period):
+    """Map staff id to payslip id for payslips already written in the period"""
+    return dict(Payslip.objects.filter(payroll_period=period).values_list('staff_id', 'id'))
+
+
+def save_payslips(period, payslips, existing=None):
+    """Insert new payslips and update existing ones for the period in bulk"""
+    if existing is None:
+        existing = existing_payslip_ids(period)
+    to_create, to_update = [], []
+    for staff_id, values in payslips.items():
+        payslip = Payslip(staff_id=staff_id, payroll_period_id=period.id, **values)
+        if staff_id in existing:
+            payslip.pk = existing[staff_id]
+            payslip._state.adding = False
+            to_update.append(payslip)
+        else:
+            to_create.append(payslip)
+
+    with transaction.atomic():
+        Payslip.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        Payslip.objects.bulk_update(to_update, PAYSLIP_FIELDS, batch_size=BULK_BATCH_SIZE)
+    # bulk_update bypasses post_save, so drop the rendered PDFs here
+    purge_cached_payslips(payslip.pk for payslip in to_update)
+    return len(to_create), len(to_update)
+
+
+def open_periods():
+    """Periods whose payslips can still change"""
+    return list(PayrollPeriod.objects.filter(is_processed=False))
+
+
+def snapshot_inputs(periods):
+    """Inputs of each period, loaded before an input changes.
+
+    recompute_payslips reloads only the changed lookup on top of these, and a
+    cached preview still matching their signature was current right up to the
+    change, so it can be patched rather than dropped.
+    """
+    return {period.id: PayrollInputs.load(period) for period in periods}
+
+
+INPUT_LOADERS = {
+    'structures': lambda period: load_salary_structures(),
+    'loan_deductions': load_loan_deductions,
+}
+
+
+def recompute_payslips(trigger_type, trigger_id, description, affects, inputs_before, changed, user=None):
+    """Recompute the staff rows selected by `affects` in every open period.
+
+    `changed` names the PayrollInputs lookup that changed (see INPUT_LOADERS);
+    only that lookup is reloaded on top of `inputs_before`. Payslips of affected
+    staff who no longer get one (their structure was deactivated) are deleted.
+    Returns the PayrollRecompute records written, one per period.
+    """
+    recomputes = []
+    for period in open_periods():
+        before = inputs_before.get(period.id)
+        if before is None:
+            inputs = PayrollInputs.load(period)
+        else:
+            inputs = before.for_staff(before.staff)
+            setattr(inputs, changed, INPUT_LOADERS[changed](period))
+        affected = inputs.for_staff([row for row in inputs.staff if affects(row)])
+        affected_ids = {row['id'] for row in affected.staff}
+        payslips = compute_payslips(affected)
+
+        # Payslips only exist for departments a run has already written;
+        # the rest are created when the period is processed
+        existing = {
+            staff_id: payslip_id for staff_id, payslip_id in existing_payslip_ids(period).items()
+            if staff_id in affected_ids
+        }
+        removed = [payslip_id for staff_id, payslip_id in existing.items() if staff_id not in payslips]
+        with transaction.atomic():
+            _, updated = save_payslips(
+                period, {staff_id: payslips[staff_id] for staff_id in existing if staff_id in payslips}, existing,
+            )
+            if removed:
+                Payslip.objects.filter(pk__in=removed).delete()
+
+            cached = cache.get(preview_cache_key(period))
+            patched = bool(cached) and before is not None and cached['signature'] == before.signature()
+            if patched:
+                rows = [row for row in cached['rows'] if row[0] not in affected_ids]
+                rows.extend(_encode_payslips(payslips))
+                cache.set(
+                    preview_cache_key(period),
+                    {'signature': inputs.signature(), 'rows': rows},
+                    PREVIEW_CACHE_TIMEOUT,
+                )
+
+            recomputes.append(PayrollRecompute.objects.create(
+                payroll_period=period,
+                trigger_type=trigger_type,
+                trigger_id=trigger_id,
+                description=description,
+                staff_affected=len(affected_ids),
+                payslips_updated=updated,
+                payslips_removed=len(removed),
+                preview_patched=patched,
+                triggered_by=user,
+            ))
+    return recomputes
+
+
+def post_loan_repayments(period):
+    """Post the period's installments to their loans with one bulk update.
+
+    Only staff who were actually paid in the period have their installments
+    posted, matching the loan_deduction on their payslip; the others stay
+    unpaid and are carried into the next period. Balances are summed
+    as Decimals here rather than in SQL, which SQLite would do in floats.
+    Returns the number of loans updated.
+    """
+    due = period_installments(period).filter(
+        is_paid=False,
+        loan__staff_id__in=Payslip.objects.filter(payroll_period=period).values('staff_id'),
+    )
+    totals = {
+        row['loan_id']: row for row in
+        due.values('loan_id').annotate(total=Sum('amount'), principal=Sum('principal'))
+    }
+    if not totals:
+        return 0
+
+    loans = LoanRecord.objects.in_bulk(list(totals))
+    for loan_id, loan in loans.items():
+        loan.amount_paid += totals[loan_id]['total']
+        loan.balance -= totals[loan_id]['principal']
+        if loan.balance <= 0:
+            loan.balance = ZERO
+            loan.status = 'completed'
+    due.update(is_paid=True, payroll_period=period)
+    LoanRecord.objects.bulk_update(loans.values(), ['amount_paid', 'balance', 'status'], batch_size=BULK_BATCH_SIZE)
+    return len(loans)
+
+
+def summarize_period(period):
+    """Materialize the period's totals per reporting dimension, one grouped query each"""
+    totals = {
+        'headcount': Count('id'),
+        'gross_pay': Sum('gross_pay'),
+        'total_deductions': Sum('total_deductions'),
+        'net_pay': Sum('net_pay'),
+    }
+    payslips = Payslip.objects.filter(payroll_period=period)
+    summaries = []
+    overall = payslips.aggregate(**totals)
+    if overall['headcount']:
+        summaries.append(PayrollSummary(payroll_period=period, dimension='total', label='All staff', **overall))
+
+    for dimension, (key_field, label) in SUMMARY_DIMENSIONS.items():
+        fields = [key_field] if isinstance(label, dict) else [key_field, label]
+        for row in payslips.values(*fields).annotate(**totals).order_by():
+            key = row.pop(key_field)
+            name = label.get(key, key) if isinstance(label, dict) else row.pop(label)
+            summaries.append(PayrollSummary(
+                payroll_period=period,
+                dimension=dimension,
+                key='' if key is None else str(key),
+                label=name or 'Unassigned',
+                **row,
+            ))
+
+    with transaction.atomic():
+        PayrollSummary.objects.filter(payroll_period=period).delete()
+        PayrollSummary.objects.bulk_create(summaries)
+    return summaries
+
+
+def accumulate_year_to_date(period):
+    """Add the period's payslips to the year-to-date rows of the staff paid in it.
+
+    Runs once per period at close, so only this period's payslips are read;
+    totals are added as Decimals and written with one bulk create and one
+    bulk update. Returns the number of staff updated.
+    """
+    year = period.end_date.year
+    payslips = {
+        row['staff_id']: row for row in
+        Payslip.objects.filter(payroll_period=period).values('staff_id', *YEAR_TO_DATE_FIELDS)
+    }
+    existing = {
+        ytd.staff_id: ytd for ytd in
+        PayrollYearToDate.objects.filter(year=year, staff_id__in=list(payslips))
+    }
+    created = []
+    for staff_id, row in payslips.items():
+        ytd = existing.get(staff_id)
+        if ytd is None:
+            ytd = PayrollYearToDate(staff_id=staff_id, year=year)
+            created.append(ytd)
+        ytd.periods += 1
+        for field in YEAR_TO_DATE_FIELDS:
+            setattr(ytd, field, getattr(ytd, field) + row[field])
+
+    updated_at = timezone.now()
+    for ytd in existing.values():
+        ytd.updated_at = updated_at
+    PayrollYearToDate.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+    PayrollYearToDate.objects.bulk_update(
+        existing.values(), ['periods', 'updated_at'] + YEAR_TO_DATE_FIELDS, batch_size=BULK_BATCH_SIZE,
+    )
+    return len(payslips)
+
+
+def rebuild_year_to_date(year):
+    """Recompute a year's rows from the payslips of its processed periods, one grouped query"""
+    rows = Payslip.objects.filter(
+        payroll_period__is_processed=True, payroll_period__end_date__year=year,
+    ).values('staff_id').annotate(
+        periods=Count('id'), **{field: Sum(field) for field in YEAR_TO_DATE_FIELDS},
+    ).order_by()
+    totals = [PayrollYearToDate(year=year, **row) for row in rows]
+
+    with transaction.atomic():
+        PayrollYearToDate.objects.filter(year=year).delete()
+        PayrollYearToDate.objects.bulk_create(totals, batch_size=BULK_BATCH_SIZE)
+    return totals
+
+
+def summarize_benefit_costs(period):
+    """Materialize employee and employer contributions per plan, for staff paid in the period"""
+    rows = active_enrollments(period).filter(
+        staff_id__in=Payslip.objects.filter(payroll_period=period).values('staff_id'),
+    ).values('benefit_plan_id').annotate(
+        enrolled_staff=Count('id'),
+        employee_total=Sum('contribution'),
+        employer_total=Sum('benefit_plan__employer_contribution'),
+    ).order_by()
+    costs = [
+        PayrollBenefitCost(
+            payroll_period=period,
+            benefit_plan_id=row['benefit_plan_id'],
+            enrolled_staff=row['enrolled_staff'],
+            employee_total=money(row['employee_total']),
+            employer_total=money(row['employer_total']),
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        PayrollBenefitCost.objects.filter(payroll_period=period).delete()
+        PayrollBenefitCost.objects.bulk_create(costs)
+    return costs
+
+
+def close_period(period, user=None):
+    """Mark the period processed once all of its payslips are written.
+
+    Posts the period's loan repayments, writes its summary and benefit cost rows
+    and adds it to the year-to-date totals. The period is marked first with a
+    conditional update, so a period that is already closed is left alone and
+    nothing is posted or accumulated twice. Returns whether it was closed here.
+    """
+    with transaction.atomic():
+        processed_date = timezone.now()
+        closed = PayrollPeriod.objects.filter(pk=period.pk, is_processed=False).update(
+            is_processed=True, processed_by=user, processed_date=processed_date,
+        )
+        period.refresh_from_db()
+        if not closed:
+            return False
+        post_loan_repayments(period)
+        summarize_period(period)
+        summarize_benefit_costs(period)
+        accumulate_year_to_date(period)
+    return True
+
+
+def run_payroll(period, user=None, workers=1, shard_by='department'):
+    """Compute and store all payslips for the period and mark it processed"""
+    inputs = PayrollInputs.load(period)
+    payslips = cached_payslips(period, inputs)
+    if payslips is None and workers > 1:
+        payslips = compute_payslips_parallel(inputs, workers, shard_by)
+    elif payslips is None:
+        payslips = compute_payslips(inputs)
+
+    with transaction.atomic():
+        save_payslips(period, payslips)
+        close_period(period, user)
+    return len(payslips)
+
+
+class RunInProgress(Exception):
+    """The payroll run has already been claimed by another process"""
+
+
+def claim_run(run, status):
+    """Move the run to `status` unless another process holds it; returns whether it was claimed.
+
+    A single conditional UPDATE, so of two processes claiming the same run
+    only one succeeds. Failed runs and queued or running ones that stopped
+    checkpointing can be claimed; a period has at most one queued or running
+    run (payroll_run_one_active), so reviving a run while another of the
+    period is active fails too.
+    """
+    claimable = Q(status='failed') | Q(
+        status__in=['queued', 'running'], updated_at__lt=timezone.now() - PayrollRun.STALE_AFTER,
+    )
+    if status == 'running':
+        claimable |= Q(status='queued')
+    try:
+        with transaction.atomic():
+            claimed = PayrollRun.objects.filter(claimable, pk=run.pk).update(status=status, updated_at=timezone.now())
+    except IntegrityError:
+        claimed = 0
+    run.refresh_from_db()
+    return bool(claimed)
+
+
+def start_run(period, user=None):
+    """Return (run, created): the unfinished run for the period, or a newly queued one.
+
+    Two requests starting the same period at once create one run between
+    them; the other gets that run back with created False.
+    """
+    run = PayrollRun.objects.filter(payroll_period=period).exclude(status='completed').first()
+    if run is not None:
+        return run, False
+    try:
+        with transaction.atomic():
+            return PayrollRun.objects.create(payroll_period=period, started_by=user), True
+    except IntegrityError:
+        return PayrollRun.objects.get(payroll_period=period, status__in=['queued', 'running']), False
+
+
+@contextmanager
+def heartbeat(run, interval=None):
+    """Touch the run's updated_at from a thread while the body runs.
+
+    Long stretches without a checkpoint (computing every department in a
+    process pool) would otherwise make a live run look stale and reclaimable.
+    """
+    interval = PayrollRun.STALE_AFTER.total_seconds() / 4 if interval is None else interval
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                PayrollRun.objects.filter(pk=run.pk, status='running').update(updated_at=timezone.now())
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _computed_chunks(chunks, precomputed=None):
+    """Yield (department_id, payslips) in order, from `precomputed` if given"""
+    if precomputed is None:
+        for department_id, chunk in chunks:
+            yield department_id, compute_payslips(chunk)
+        return
+
+    for department_id, chunk in chunks:
+        yield department_id, {
+            row['id']: precomputed[row['id']] for row in chunk.staff if row['id'] in precomputed
+        }
+
+
+def execute_run(run, log=None, workers=1):
+    """Process the run department by department, resuming after its checkpoint.
+
+    Serial by default; with more than one worker (opt-in, multi-core hosts
+    only) the pending departments are computed up front in one shard per worker. Raises RunInProgress if another process already
+    holds the run or another run of the period is active.
+    """
+    if not claim_run(run, 'running'):
+        raise RunInProgress(f'Payroll run {run.pk} is already {run.get_status_display().lower()}.')
+    period = run.payroll_period
+
+    run.started_at = run.started_at or timezone.now()
+    run.error_message = ''
+    run.save()
+
+    try:
+        inputs = PayrollInputs.load(period)
+        precomputed = cached_payslips(period, inputs)
+        chunks = inputs.by_department()
+        existing = existing_payslip_ids(period)
+        checkpoint = run.last_department_id
+        pending = [
+            (department_id, chunk) for department_id, chunk in chunks
+            if checkpoint is None or department_id > checkpoint
+        ]
+        run.total_departments = len(chunks)
+        run.completed_departments = len(chunks) - len(pending)
+        run.save(update_fields=['total_departments', 'completed_departments', 'updated_at'])
+
+        if precomputed is not None:
+            if log:
+                log('Reusing payslips from the cached preview')
+        elif workers > 1 and pending:
+            with heartbeat(run):
+                precomputed = compute_payslips_parallel(
+                    inputs.for_staff([row for department_id, chunk in pending for row in chunk.staff]), workers,
+                )
+        for department_id, payslips in _computed_chunks(pending, precomputed):
+            with transaction.atomic():
+                save_payslips(period, payslips, existing)
+                run.last_department_id = department_id
+                run.completed_departments += 1
+                run.payslips_written += len(payslips)
+                run.save(update_fields=[
+                    'last_department_id', 'completed_departments', 'payslips_written', 'updated_at',
+                ])
+            if log:
+                log(f'Department {department_id}: {len(payslips)} payslips '
+                    f'({run.completed_departments}/{run.total_departments})')
+
+        with transaction.atomic():
+            close_period(period, run.started_by)
+            run.status = 'completed'
+            run.finished_at = timezone.now()
+            run.save()
+    except Exception as e:
+        run.status = 'failed'
+        run.error_message = str(e)
+        run.save(update_fields=['status', 'error_message', 'updated_at'])
+        raise
+    return run
@@ -0,0 +1,267 @@
+"""Payslip PDF rendering.
+
+Styles and table styles are built once per process and shared by every
+document. Payslips are rendered from plain dicts (see payslip_data), so a
+whole period can be rendered across a process pool, into a ZIP of single
+payslips or one merged PDF per department.
+
+Single payslips are cached on disk under a hash of the values they are
+rendered from, so repeat downloads are a file read; a changed payslip hashes
+differently and its old files are purged when the row is saved. Whole-period
+archives are built by the export_payslips command in the background and kept
+under PAYSLIP_EXPORT_DIR until one of the period's payslips changes.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from django.conf import settings
+from django.utils.text import slugify
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+
+from .models import Payslip
+
+# Bump when the layout changes so previously cached PDFs are not served
+LAYOUT_VERSION = 3
+TITLE = "UNIVERSITY OF SIERRA LEONE - PAYSLIP"
+PAY_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+])
+BATCH_MODES = ['zip', 'department']
+ZIP_CHUNK_SIZE = 200
+# An export whose partial file has not been written to for this long is abandoned
+EXPORT_STALE_AFTER = 30 * 60
+
+AMOUNT_FIELDS = Payslip.EARNING_COMPONENTS + Payslip.DEDUCTION_COMPONENTS + [
+    'gross_pay', 'total_deductions', 'net_pay',
+]
+DATA_FIELDS = [
+    'id', 'staff__staff_id', 'staff__first_name', 'staff__last_name',
+    'staff__department_id', 'staff__department__name', 'payroll_period__name', 'unpaid_leave_days',
+] + AMOUNT_FIELDS
+
+_styles = None
+
+
+def get_styles():
+    """getSampleStyleSheet builds every style from scratch; do it once per process"""
+    global _styles
+    if _styles is None:
+        _styles = getSampleStyleSheet()
+    return _styles
+
+
+def payslip_data(payslip):
+    """Plain values needed to render one payslip, shaped like period_payslip_data rows"""
+    data = {field: getattr(payslip, field) for field in AMOUNT_FIELDS}
+    data.update({
+        'id': payslip.id,
+        'staff__staff_id': payslip.staff.staff_id,
+        'staff__first_name': payslip.staff.first_name,
+        'staff__last_name': payslip.staff.last_name,
+        'staff__department_id': payslip.staff.department_id,
+        'staff__department__name': payslip.staff.department.name,
+        'payroll_period__name': payslip.payroll_period.name,
+        'unpaid_leave_days': payslip.unpaid_leave_days,
+    })
+    return data
+
+
+def period_payslip_data(period):
+    """Render data for every payslip in the period in one query, grouped by department"""
+    return list(
+        Payslip.objects.filter(payroll_period=period)
+        .order_by('staff__department__name', 'staff__department_id', 'staff__staff_id')
+        .values(*DATA_FIELDS)
+    )
+
+
+def payslip_story(data):
+    styles = get_styles()
+    allowances = (
+        data['housing_allowance'] + data['transport_allowance']
+        + data['medical_allowance'] + data['other_allowances']
+    )
+    info_table = Table([
+        ['Staff:', f"{data['staff__first_name']} {data['staff__last_name']}", 'ID:', data['staff__staff_id']],
+        ['Department:', data['staff__department__name'], 'Period:', data['payroll_period__name']],
+    ])
+    pay_table = Table([
+        ['EARNINGS', '', 'DEDUCTIONS', ''],
+        ['Basic Salary', f"{data['basic_salary']:,.2f}", 'Income Tax', f"{data['income_tax']:,.2f}"],
+        ['Allowances', f'{allowances:,.2f}', 'NASSIT', f"{data['nassit_contribution']:,.2f}"],
+        ['', '', 'Loans', f"{data['loan_deduction']:,.2f}"],
+        ['', '', 'Benefits', f"{data['benefit_deduction']:,.2f}"],
+        ['', '', f"Unpaid Leave ({data['unpaid_leave_days']} days)", f"{data['unpaid_leave_deduction']:,.2f}"],
+        ['GROSS PAY', f"{data['gross_pay']:,.2f}", 'TOTAL DEDUCTIONS', f"{data['total_deductions']:,.2f}"],
+        ['NET PAY', f"{data['net_pay']:,.2f}", '', ''],
+    ])
+    pay_table.setStyle(PAY_TABLE_STYLE)
+    return [
+        Paragraph(TITLE, styles['Title']),
+        Spacer(1, 12),
+        info_table,
+        Spacer(1, 20),
+        pay_table,
+    ]
+
+
+def render_pdf(payslips):
+    """One PDF document with a page per payslip"""
+    buffer = io.BytesIO()
+    story = []
+    for data in payslips:
+        if story:
+            story.append(PageBreak())
+        story.extend(payslip_story(data))
+    SimpleDocTemplate(buffer, pagesize=A4).build(story)
+    return buffer.getvalue()
+
+
+def render_payslip_pdf(data):
+    return render_pdf([data])
+
+
+def payslip_filename(data):
+    return f"payslip_{data['staff__staff_id']}.pdf"
+
+
+def payslip_digest(data):
+    """Content hash of everything that ends up on the rendered payslip"""
+    payload = json.dumps([LAYOUT_VERSION, data], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_directory(payslip_id):
+    return settings.PAYSLIP_PDF_CACHE_DIR / str(payslip_id)
+
+
+def cached_payslip_path(data, digest=None):
+    """Path of the rendered PDF for these values, rendering it on a cache miss"""
+    digest = digest or payslip_digest(data)
+    directory = cache_directory(data['id'])
+    path = directory / f'{digest}.pdf'
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(render_payslip_pdf(data))
+        os.replace(tmp_path, path)
+    return path
+
+
+def purge_cached_payslips(payslip_ids):
+    """Remove cached PDFs of payslips whose rows changed or were deleted"""
+    for payslip_id in payslip_ids:
+        shutil.rmtree(cache_directory(payslip_id), ignore_errors=True)
+
+
+def _render_singles(payslips):
+    """Process pool task: individual PDFs for a chunk of payslips"""
+    return [(payslip_filename(data), render_payslip_pdf(data)) for data in payslips]
+
+
+def _render_department(payslips):
+    """Process pool task: one merged PDF for a department"""
+    first = payslips[0]
+    filename = f"{slugify(first['staff__department__name'])}-{first['staff__department_id']}.pdf"
+    return [(filename, render_pdf(payslips))]
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def render_period_payslips(period, output, mode='zip', workers=1):
+    """Write a ZIP of the period's payslips to `output` (a path or file object).
+
+    mode 'zip' stores one PDF per payslip; mode 'department' stores one merged
+    PDF per department. Returns (payslip count, seconds, payslips per second).
+    """
+    start = time.perf_counter()
+    payslips = period_payslip_data(period)
+    if mode == 'department':
+        tasks = [
+            list(group) for department_id, group in groupby(payslips, key=lambda data: data['staff__department_id'])
+        ]
+        render = _render_department
+    else:
+        tasks = [payslips[i:i + ZIP_CHUNK_SIZE] for i in range(0, len(payslips), ZIP_CHUNK_SIZE)]
+        render = _render_singles
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                results = executor.map(render, tasks)
+                for files in results:
+                    for filename, content in files:
+                        archive.writestr(filename, content)
+        else:
+            for task in tasks:
+                for filename, content in render(task):
+                    archive.writestr(filename, content)
+
+    elapsed = time.perf_counter() - start
+    rate = len(payslips) / elapsed if elapsed else 0
+    return len(payslips), elapsed, rate
+
+
+def export_path(period_id, mode):
+    """Where the finished archive of a period's payslips is kept"""
+    return os.path.join(settings.PAYSLIP_EXPORT_DIR, f'payslips_{period_id}_{mode}_v{LAYOUT_VERSION}.zip')
+
+
+def claim_export(path):
+    """Mark an export of `path` as in progress; False if a recent one already is"""
+    partial = path + '.part'
+    os.makedirs(os.path.dirname(partial), exist_ok=True)
+    try:
+        os.close(os.open(partial, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(partial) < EXPORT_STALE_AFTER:
+                return False
+            os.utime(partial)
+        except FileNotFoundError:
+            # The other export finished (or failed) meanwhile; let the caller look again
+            return False
+        return True
+
+
+def write_period_payslips(period, path, mode='zip', workers=1):
+    """Render the period's payslips to `path` via a partial file, so readers never see half an archive"""
+    partial = path + '.part'
+    directory = os.path.dirname(partial)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        result = render_period_payslips(period, partial, mode=mode, workers=workers)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return result
+
+
+def purge_period_exports(period_id):
+    """Remove finished archives of a period whose payslips changed"""
+    for mode in BATCH_MODES:
+        try:
+            os.remove(export_path(period_id, mode))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,182 @@
+"""Full-text staff search.
+
+Staff documents live in a `staff_search` table kept in step with Staff by
+signals: an FTS5 virtual table on SQLite and a tsvector column with a GIN
+index on PostgreSQL, both created by migration 0021. Other databases fall
+back to icontains lookups. Every backend answers the same question: the ids
+of the best matching staff, best first.
+
+Search terms are reduced to words and matched as prefixes, so user input is
+never interpreted as query syntax.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Staff
+
+TABLE = 'staff_search'
+BATCH_SIZE = 2000
+
+# Staff fields making up each column of the document, most significant first
+COLUMNS = {
+    'name': ['first_name', 'last_name'],
+    'staff_id': ['staff_id'],
+    'email': ['email'],
+    'position': ['position'],
+    'qualifications': ['highest_qualification', 'other_qualifications'],
+    'institution': ['institution'],
+    'publications': ['publications'],
+}
+SOURCE_FIELDS = [field for fields in COLUMNS.values() for field in fields]
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def documents(rows):
+    """(id, column text...) tuples from values_list('id', *SOURCE_FIELDS) rows"""
+    for row in rows:
+        values = iter(row[1:])
+        yield (row[0],) + tuple(
+            ' '.join(str(next(values) or '') for field in fields).strip() for fields in COLUMNS.values()
+        )
+
+
+class SQLiteBackend:
+    """FTS5 table keyed by rowid = staff id, ranked with weighted BM25"""
+    weights = '10.0, 10.0, 5.0, 3.0, 1.0, 1.0, 0.5'
+
+    def upsert(self, cursor, docs):
+        placeholders = ', '.join(['%s'] * (len(COLUMNS) + 1))
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, {", ".join(COLUMNS)}) VALUES ({placeholders})', docs,
+        )
+
+    def delete(self, cursor, staff_ids):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in staff_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    def search(self, cursor, words, limit):
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}, {self.weights}) LIMIT %s',
+            [' '.join(f'"{word}"*' for word in words), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLBackend:
+    """tsvector per staff member, weighted A-D by column and ranked with ts_rank"""
+    weights = ['A', 'A', 'A', 'B', 'C', 'C', 'D']
+
+    def upsert(self, cursor, docs):
+        vector = ' || '.join(f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in self.weights)
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (staff_id, document) VALUES (%s, {vector}) '
+            f'ON CONFLICT (staff_id) DO UPDATE SET document = EXCLUDED.document',
+            docs,
+        )
+
+    def delete(self, cursor, staff_ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE staff_id = ANY(%s)', [list(staff_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLE}')
+
+    def search(self, cursor, words, limit):
+        query = ' & '.join(f'{word}:*' for word in words)
+        cursor.execute(
+            f"SELECT staff_id FROM {TABLE}, to_tsquery('simple', %s) query WHERE document @@ query "
+            f'ORDER BY ts_rank(document, query) DESC LIMIT %s',
+            [query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackBackend:
+    """No index: every word must appear in some field; results by name"""
+
+    def upsert(self, cursor, docs):
+        pass
+
+    def delete(self, cursor, staff_ids):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    def search(self, cursor, words, limit):
+        queryset = Staff.objects.all()
+        for word in words:
+            condition = Q()
+            for field in SOURCE_FIELDS:
+                condition |= Q(**{f'{field}__icontains': word})
+            queryset = queryset.filter(condition)
+        return list(queryset.order_by('last_name', 'first_name').values_list('id', flat=True)[:limit])
+
+
+BACKENDS = {'sqlite': SQLiteBackend, 'postgresql': PostgreSQLBackend}
+
+
+def backend():
+    return BACKENDS.get(connection.vendor, FallbackBackend)()
+
+
+def search_staff_ids(query, limit=50):
+    """Ids of the staff best matching `query`, best first"""
+    words = terms(query)
+    if not words:
+        return []
+    with connection.cursor() as cursor:
+        return backend().search(cursor, words, limit)
+
+
+def search_staff(query, queryset=None, limit=50, candidates=500):
+    """Matching staff from `queryset` (default: all staff) in rank order.
+
+    The index returns up to `candidates` ranked ids, which are narrowed by
+    the queryset's filters with an id-only query before the top `limit`
+    rows are loaded.
+    """
+    ids = search_staff_ids(query, candidates)
+    if not ids:
+        return []
+    queryset = Staff.objects.all() if queryset is None else queryset
+    rank = {pk: position for position, pk in enumerate(ids)}
+    allowed = set(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+    top = [pk for pk in ids if pk in allowed][:limit]
+    return sorted(queryset.filter(pk__in=top), key=lambda staff: rank[staff.pk])
+
+
+def index_staff(staff):
+    """Refresh the documents of the given Staff instances"""
+    rows = [(member.pk,) + tuple(getattr(member, field) for field in SOURCE_FIELDS) for member in staff]
+    with connection.cursor() as cursor:
+        backend().upsert(cursor, list(documents(rows)))
+
+
+def remove_staff(staff_ids):
+    with connection.cursor() as cursor:
+        backend().delete(cursor, staff_ids)
+
+
+def rebuild_index():
+    """Re-index every staff member in batches; returns the number indexed"""
+    search_backend = backend()
+    rows = Staff.objects.order_by('id').values_list('id', *SOURCE_FIELDS).iterator(chunk_size=BATCH_SIZE)
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        search_backend.clear(cursor)
+        batch = []
+        for doc in documents(rows):
+            batch.append(doc)
+            if len(batch) == BATCH_SIZE:
+                search_backend.upsert(cursor, batch)
+                count += len(batch)
+                batch = []
+        search_backend.upsert(cursor, batch)
+    return count + len(batch)
@@ -0,0 +1,103 @@
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ContractRenewalMilestone, Department, LoanRecord, Payslip, SalaryStructure, Staff, SystemSettings
+
+
+@receiver([post_save, post_delete], sender=Payslip)
+def purge_payslip_pdf(sender, instance, **kwargs):
+    """Rendered PDFs are keyed on the payslip's values; drop them once the row changes"""
+    from .payslip_pdf import purge_cached_payslips, purge_period_exports
+    purge_cached_payslips([instance.pk])
+    purge_period_exports(instance.payroll_period_id)
+
+
+@receiver(pre_save, sender=SalaryStructure)
+def snapshot_payroll_inputs(sender, instance, raw=False, **kwargs):
+    """Remember the structure's old key and the open periods' inputs before the change"""
+    if raw:
+        return
+    from .payroll import open_periods, snapshot_inputs, structure_key
+    previous = SalaryStructure.objects.filter(pk=instance.pk).values(
+        'staff_category', 'staff_grade', 'employment_type',
+    ).first() if instance.pk else None
+    instance._previous_key = structure_key(previous) if previous else None
+    instance._inputs_before = snapshot_inputs(open_periods())
+
+
+@receiver(post_save, sender=SalaryStructure)
+def recompute_structure_payslips(sender, instance, raw=False, **kwargs):
+    """Recompute only the staff on this structure's (category, grade, employment type)"""
+    if raw:
+        return
+    from .payroll import recompute_payslips, structure_key
+    keys = {
+        (instance.staff_category, instance.staff_grade, instance.employment_type),
+        instance._previous_key,
+    }
+    recompute_payslips(
+        'salary_structure', instance.pk, f'Salary structure changed: {instance}',
+        lambda row: structure_key(row) in keys, instance._inputs_before, 'structures',
+    )
+
+
+@receiver(pre_save, sender=LoanRecord)
+def remember_loan_status(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._previous_status = LoanRecord.objects.filter(pk=instance.pk).values_list(
+        'status', flat=True,
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=LoanRecord)
+def schedule_activated_loan(sender, instance, raw=False, **kwargs):
+    """A loan that becomes active, however it is saved, gets its installment schedule"""
+    if raw or instance.status != 'active' or instance._previous_status == 'active':
+        return
+    if instance.start_deduction_date:
+        instance.generate_schedule()
+
+
+@receiver(post_save, sender=Staff)
+def index_staff_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from . import fuzzy, search
+    search.index_staff([instance])
+    fuzzy.index_staff(instance)
+
+
+@receiver(post_save, sender=Staff)
+def sync_contract_renewal_milestones(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ContractRenewalMilestone.sync(instance)
+
+
+@receiver(post_delete, sender=Staff)
+def remove_staff_search(sender, instance, **kwargs):
+    from .search import remove_staff
+    remove_staff([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Staff)
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_staff_facets(sender, **kwargs):
+    from .facets import invalidate
+    invalidate()
+
+
+@receiver(request_started)
+def refresh_system_settings(sender, **kwargs):
+    """Each request re-reads the shared settings entry, so saves in other workers show up"""
+    SystemSettings.clear_cache()
+
+
+@receiver([post_save, post_delete], sender=SystemSettings)
+def invalidate_system_settings(sender, **kwargs):
+    # Again after commit, in case another worker re-cached the old row in the meantime
+    SystemSettings.clear_cache(shared=True)
+    transaction.on_commit(lambda: SystemSettings.clear_cache(shared=True))
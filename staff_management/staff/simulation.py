@@ -0,0 +1,182 @@
+"""Salary budget what-if simulation.
+
+The active staff population is reduced to a count matrix of (salary
+structure key x months still employed in the horizon), taking retirement
+dates into account, so projecting a variant is one array product no matter
+how many staff there are. Each variant is a list of changes to salary
+structures (a percentage or flat raise, or explicit earnings, optionally
+from a later month) and is costed as monthly gross pay.
+"""
+import math
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from .models import Staff, SalaryStructure, SystemSettings
+
+EARNING_FIELDS = [
+    'basic_salary', 'housing_allowance', 'transport_allowance',
+    'medical_allowance', 'other_allowances',
+]
+KEY_FIELDS = ['staff_category', 'staff_grade', 'employment_type']
+MAX_MONTHS = 60
+MAX_VARIANTS = 200
+
+
+class SimulationError(ValueError):
+    """Scenario that cannot be simulated; the message is safe to show to the user"""
+
+
+def finite(value, name):
+    """`value` as a float, refusing NaN and infinities (which JSON cannot carry)"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise SimulationError(f'{name} must be a finite number')
+    return number
+
+
+class Population:
+    """Active staff grouped by structure key and by the number of horizon months they are paid"""
+
+    def __init__(self, start, months):
+        self.start = start
+        self.months = months
+
+        structures = SalaryStructure.objects.filter(is_active=True).values(*KEY_FIELDS, *EARNING_FIELDS)
+        self.earnings = {
+            tuple(row[field] for field in KEY_FIELDS): np.array([float(row[field]) for field in EARNING_FIELDS])
+            for row in structures
+        }
+        staff = list(Staff.objects.filter(status='active').values_list(*KEY_FIELDS, 'date_of_birth'))
+
+        # Structure keys of the staff as well, so a proposed new structure can cover them
+        self.keys = sorted(set(self.earnings) | {row[:3] for row in staff})
+        key_index = {key: i for i, key in enumerate(self.keys)}
+
+        retirement_age = SystemSettings.get_settings().retirement_age
+        indexes = np.fromiter((key_index[row[:3]] for row in staff), dtype=np.int64, count=len(staff))
+        births = np.array([(row[3].year, row[3].month, row[3].day) for row in staff], dtype=np.int64).reshape(-1, 3)
+
+        # Staff are paid for every month that starts before their retirement date
+        retirement_month = (births[:, 0] + retirement_age - start.year) * 12 + (births[:, 1] - start.month)
+        paid_months = np.clip(retirement_month + (births[:, 2] > 1), 0, months)
+
+        # counts[k, m]: staff on key k paid for exactly m months; active[k, m]: staff on key k paid in month m
+        counts = np.zeros((len(self.keys), months + 1), dtype=np.int64)
+        np.add.at(counts, (indexes, paid_months), 1)
+        self.active = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+        self.headcount = self.active.sum(axis=0)
+        # Staff whose pay stops at the start of month m (month 0 includes anyone already past retirement)
+        self.retirements = counts.sum(axis=0)[:months]
+
+    def baseline(self):
+        """Monthly earnings per key (months x keys x earning fields) under the current structures"""
+        current = np.zeros((len(self.keys), len(EARNING_FIELDS)))
+        for i, key in enumerate(self.keys):
+            if key in self.earnings:
+                current[i] = self.earnings[key]
+        return np.broadcast_to(current, (self.months,) + current.shape).copy()
+
+    def matches(self, change):
+        """Boolean mask of keys a change applies to; missing filters match everything"""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for position, field in enumerate(KEY_FIELDS):
+            if change.get(field):
+                mask &= np.array([key[position] == change[field] for key in self.keys])
+        return mask
+
+    def apply(self, earnings, change):
+        """Apply one change in place from its effective month on"""
+        month = int(change.get('effective_month') or 0)
+        if not 0 <= month < self.months:
+            raise SimulationError(f'effective_month must be between 0 and {self.months - 1}')
+        mask = self.matches(change)
+        window = earnings[month:, mask]
+        for position, field in enumerate(EARNING_FIELDS):
+            if change.get(field) not in (None, ''):
+                window[:, :, position] = finite(Decimal(str(change[field])), field)
+        if change.get('percent'):
+            window[:, :, 0] *= 1 + finite(change['percent'], 'percent') / 100
+        if change.get('amount'):
+            window[:, :, 0] += finite(change['amount'], 'amount')
+        earnings[month:, mask] = window
+
+    def cost(self, earnings):
+        """Monthly gross payroll cost for per-month, per-key earnings"""
+        return np.einsum('mk,km->m', earnings.sum(axis=2), self.active)
+
+
+def month_start(value):
+    if not value:
+        today = date.today()
+        return date(today.year, today.month, 1) + relativedelta(months=1)
+    try:
+        year, month = (int(part) for part in str(value).split('-')[:2])
+        return date(year, month, 1)
+    except ValueError:
+        raise SimulationError('start must be a month like 2025-07')
+
+
+def simulate(scenario):
+    """Project monthly payroll cost of the baseline and every variant in `scenario`.
+
+    scenario = {'start': 'YYYY-MM', 'months': 12, 'variants': [
+        {'name': ..., 'changes': [{'staff_grade': '3', 'percent': 5, 'effective_month': 3}, ...]},
+    ]}
+    """
+    start = month_start(scenario.get('start'))
+    try:
+        months = int(scenario.get('months', 12))
+    except (TypeError, ValueError):
+        months = 0
+    if not 1 <= months <= MAX_MONTHS:
+        raise SimulationError(f'months must be between 1 and {MAX_MONTHS}')
+    variants = scenario.get('variants') or []
+    if not isinstance(variants, list):
+        raise SimulationError('variants must be a list')
+    if len(variants) > MAX_VARIANTS:
+        raise SimulationError(f'At most {MAX_VARIANTS} variants can be simulated at once')
+    for number, variant in enumerate(variants, start=1):
+        if not isinstance(variant, dict):
+            raise SimulationError(f'Variant {number} must be an object with a name and changes')
+        if not isinstance(variant.get('changes') or [], list):
+            raise SimulationError(f'changes of {variant.get("name") or f"variant {number}"} must be a list')
+
+    population = Population(start, months)
+    baseline = population.baseline()
+    baseline_cost = population.cost(baseline)
+
+    results = []
+    for number, variant in enumerate(variants, start=1):
+        earnings = baseline.copy()
+        # Overflow is caught below, once the variant is costed
+        with np.errstate(over='ignore', invalid='ignore'):
+            for change in variant.get('changes') or []:
+                try:
+                    population.apply(earnings, change)
+                except SimulationError:
+                    raise
+                except (AttributeError, TypeError, ValueError, ArithmeticError):
+                    raise SimulationError(f'Invalid change in {variant.get("name") or f"variant {number}"}: {change}')
+            monthly = population.cost(earnings)
+        if not np.isfinite(monthly).all():
+            raise SimulationError(f'{variant.get("name") or f"Variant {number}"} costs more than can be computed')
+        results.append({
+            'name': variant.get('name') or f'Variant {number}',
+            'monthly_cost': np.round(monthly, 2).tolist(),
+            'total_cost': round(float(monthly.sum()), 2),
+            'delta': round(float(monthly.sum() - baseline_cost.sum()), 2),
+        })
+
+    return {
+        'months': [(start + relativedelta(months=m)).strftime('%Y-%m') for m in range(months)],
+        'headcount': population.headcount.tolist(),
+        'retirements': population.retirements.tolist(),
+        'baseline': {
+            'monthly_cost': np.round(baseline_cost, 2).tolist(),
+            'total_cost': round(float(baseline_cost.sum()), 2),
+        },
+        'variants': results,
+    }
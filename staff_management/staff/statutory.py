@@ -0,0 +1,74 @@
+"""Income tax and NASSIT from effective-dated bracket tables.
+
+A table is a list of (lower, upper, rate) bands in integer cents and rate
+units (hundredths of a percent). Each band charges its rate on the slice of
+basic salary between its bounds, so a top band with an upper bound caps the
+contribution. evaluate() applies a table to a whole batch of salaries with
+NumPy; evaluate_scalar() is the Decimal reference it must match exactly.
+Both round half up to the cent once, on the total.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from .models import StatutoryBracket
+
+SCHEMES = [scheme for scheme, label in StatutoryBracket.SCHEMES]
+# Flat percentages used for a scheme that has no brackets configured
+DEFAULT_RATES = {'income_tax': Decimal('10'), 'nassit': Decimal('5')}
+RATE_SCALE = 10000
+CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    return int((Decimal(value) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def rate_units(rate):
+    """Percentage as an integer number of 1/RATE_SCALE"""
+    return int((Decimal(rate) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def default_tables():
+    return {scheme: [(0, None, rate_units(DEFAULT_RATES[scheme]))] for scheme in SCHEMES}
+
+
+def load_tables(as_of):
+    """Bracket table of each scheme in force on `as_of`"""
+    rows = StatutoryBracket.objects.filter(effective_from__lte=as_of).values(
+        'scheme', 'effective_from', 'lower_bound', 'upper_bound', 'rate',
+    ).order_by('scheme', '-effective_from', 'lower_bound')
+
+    loaded, in_force = {}, {}
+    for row in rows:
+        # Rows come newest first; only the latest table of each scheme applies
+        effective_from = in_force.setdefault(row['scheme'], row['effective_from'])
+        if row['effective_from'] == effective_from:
+            loaded.setdefault(row['scheme'], []).append((
+                to_cents(row['lower_bound']),
+                None if row['upper_bound'] is None else to_cents(row['upper_bound']),
+                rate_units(row['rate']),
+            ))
+    tables = default_tables()
+    tables.update(loaded)
+    return tables
+
+
+def evaluate(base_cents, table):
+    """Deduction in cents for every salary in the int64 array `base_cents`"""
+    total = np.zeros_like(base_cents)
+    for lower, upper, rate in table:
+        band = np.clip(base_cents - lower, 0, None if upper is None else upper - lower)
+        total += band * rate
+    return (total + RATE_SCALE // 2) // RATE_SCALE
+
+
+def evaluate_scalar(amount, table):
+    """Reference implementation: deduction for one Decimal amount"""
+    total = Decimal('0')
+    for lower, upper, rate in table:
+        lower = Decimal(lower).scaleb(-2)
+        top = amount if upper is None else min(amount, Decimal(upper).scaleb(-2))
+        if top > lower:
+            total += (top - lower) * rate / RATE_SCALE
+    return total.quantize(CENT, rounding=ROUND_HALF_UP)
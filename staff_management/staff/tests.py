@@ -1,3 +1,751 @@
-from django.test import TestCase
+import smtplib
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import IntegrityError, connection, transaction
+from django.http import QueryDict
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import numpy as np
+
+from .models import (
+    Announcement, AnnouncementDelivery, ContractRenewalMilestone, Department, HRMO, Leave, LoanRecord, OutboundEmail, PayrollPeriod,
+    PayrollRecompute, PayrollRun, PayrollSummary, PayrollYearToDate, Payslip, SalaryStructure, School, Staff, StatutoryBracket, SystemSettings,
+)
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_staff(department, number, **fields):
+    values = {
+        'staff_id': f'USL{number:05d}',
+        'first_name': f'First{number}',
+        'last_name': f'Last{number}',
+        'email': f'staff{number}@usl.edu.sl',
+        'phone': '076000000',
+        'date_of_birth': date(1980, 1, 1),
+        'address': 'Freetown',
+        'next_of_kin_name': 'Kin',
+        'next_of_kin_relationship': 'Sibling',
+        'next_of_kin_phone': '076000001',
+        'next_of_kin_address': 'Freetown',
+        'department': department,
+        'position': 'Lecturer',
+        'staff_type': 'academic',
+        'staff_category': 'senior',
+        'staff_grade': '1',
+        'employment_type': 'full_time',
+        'hire_date': date(2015, 1, 1) + timedelta(days=number % 7),
+        'nassit_number': f'N{number}',
+        'highest_qualification': 'PhD',
+        'institution': 'USL',
+        'graduation_year': 2005,
+    }
+    values.update(fields)
+    return Staff.objects.create(**values)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StaffTestCase(TestCase):
+    def setUp(self):
+        SystemSettings.clear_cache(shared=True)
+        school = School.objects.create(name='Science', code='SCI')
+        self.departments = [
+            Department.objects.create(name=f'Department {i}', code=f'D{i}', school=school) for i in range(3)
+        ]
+        self.next_number = 1
+
+    def add_staff(self, count, **fields):
+        staff = []
+        for _ in range(count):
+            staff.append(make_staff(self.departments[self.next_number % 3], self.next_number, **fields))
+            self.next_number += 1
+        return staff
+
+
+class PayrollTestCase(StaffTestCase):
+    def setUp(self):
+        super().setUp()
+        SalaryStructure.objects.create(
+            staff_category='senior', staff_grade='1', employment_type='full_time',
+            basic_salary=Decimal('4321.57'), housing_allowance=Decimal('250'), transport_allowance=Decimal('75.50'),
+        )
+        SalaryStructure.objects.create(
+            staff_category='junior', staff_grade='j1', employment_type='full_time',
+            basic_salary=Decimal('899.99'), other_allowances=Decimal('12.34'),
+        )
+        for lower, upper, rate in [(0, 1000, '0'), (1000, 3000, '15'), (3000, None, '30')]:
+            StatutoryBracket.objects.create(
+                scheme='income_tax', effective_from=date(2024, 1, 1), lower_bound=lower, upper_bound=upper, rate=rate,
+            )
+        StatutoryBracket.objects.create(
+            scheme='nassit', effective_from=date(2024, 1, 1), lower_bound=0, upper_bound=4000, rate='5',
+        )
+        self.period = PayrollPeriod.objects.create(
+            name='January 2025', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+        )
+
+    def add_mixed_staff(self, count):
+        staff = []
+        for i in range(count):
+            if i % 2:
+                staff += self.add_staff(1, staff_category='junior', staff_grade='j1')
+            else:
+                staff += self.add_staff(1)
+        return staff
+
+    def load_and_compute(self):
+        from .payroll import PayrollInputs, compute_payslips
+        inputs = PayrollInputs.load(self.period)
+        return inputs, compute_payslips(inputs)
+
+
+class PayrollComputationTests(PayrollTestCase):
+    def test_compute_payslips_matches_calculate_payslip(self):
+        from .payroll import calculate_payslip
+        self.add_mixed_staff(6)
+        self.add_staff(1, staff_grade='2')  # no salary structure
+
+        inputs, payslips = self.load_and_compute()
+        expected = {}
+        for row in inputs.staff:
+            values = calculate_payslip(row, inputs)
+            if values is not None:
+                expected[row['id']] = values
+        self.assertEqual(payslips, expected)
+        self.assertEqual(len(payslips), 6)
+
+    def test_query_count_does_not_grow_with_staff(self):
+        self.add_mixed_staff(3)
+        with CaptureQueriesContext(connection) as small:
+            self.load_and_compute()
+        self.add_mixed_staff(30)
+        with CaptureQueriesContext(connection) as large:
+            inputs, payslips = self.load_and_compute()
+        self.assertEqual(len(payslips), 33)
+        self.assertEqual(len(large), len(small))
+
+    def test_unpaid_leave_is_deducted_pro_rata(self):
+        from .payroll import money
+        staff, = self.add_staff(1)
+        for start, end in [
+            (date(2025, 1, 10), date(2025, 1, 14)),
+            (date(2025, 1, 12), date(2025, 1, 16)),
+            (date(2024, 12, 30), date(2025, 1, 1)),
+        ]:
+            Leave.objects.create(
+                staff=staff, leave_type='unpaid', start_date=start, end_date=end,
+                days_requested=(end - start).days + 1, reason='Personal', status='approved',
+            )
+        inputs, payslips = self.load_and_compute()
+        self.assertEqual(payslips[staff.id]['unpaid_leave_days'], 8)
+        self.assertEqual(payslips[staff.id]['unpaid_leave_deduction'], money(Decimal('4321.57') * 8 / 31))
+
+    def test_activated_loan_is_scheduled_and_deducted(self):
+        staff, = self.add_staff(1)
+        loan = LoanRecord.objects.create(
+            staff=staff, loan_type='housing', amount=Decimal('1200'), interest_rate=Decimal('5'),
+            repayment_months=12, monthly_deduction=Decimal('105'), balance=Decimal('1200'),
+            start_deduction_date=date(2025, 1, 15),
+        )
+        self.assertFalse(loan.installments.exists())
+        loan.status = 'active'
+        loan.save()
+        self.assertEqual(loan.installments.count(), 12)
+        inputs, payslips = self.load_and_compute()
+        self.assertEqual(payslips[staff.id]['loan_deduction'], Decimal('105.00'))
+
+
+
+
+class StructureRecomputeTests(PayrollTestCase):
+    def setUp(self):
+        super().setUp()
+        from .payroll import preview_payroll, save_payslips
+        self.staff = self.add_mixed_staff(4)
+        inputs, payslips = self.load_and_compute()
+        save_payslips(self.period, payslips)
+        preview_payroll(self.period)
+        self.senior = SalaryStructure.objects.get(staff_category='senior')
+
+    def basic_salaries(self):
+        return dict(Payslip.objects.filter(payroll_period=self.period).values_list('staff_id', 'basic_salary'))
+
+    def test_structure_change_updates_payslips_and_preview(self):
+        from .payroll import PayrollInputs, cached_payslips
+        before = self.basic_salaries()
+        self.senior.basic_salary = Decimal('5000')
+        self.senior.save()
+
+        after = self.basic_salaries()
+        for staff in self.staff:
+            expected = Decimal('5000') if staff.staff_category == 'senior' else before[staff.id]
+            self.assertEqual(after[staff.id], expected)
+        inputs, payslips = self.load_and_compute()
+        self.assertEqual(cached_payslips(self.period, PayrollInputs.load(self.period)), payslips)
+        recompute = PayrollRecompute.objects.get(payroll_period=self.period)
+        self.assertEqual((recompute.staff_affected, recompute.payslips_updated, recompute.preview_patched), (2, 2, True))
+
+    def test_deactivated_structure_removes_its_payslips(self):
+        self.senior.is_active = False
+        self.senior.save()
+        self.assertEqual(set(self.basic_salaries()), {staff.id for staff in self.staff if staff.staff_category == 'junior'})
+        self.assertEqual(PayrollRecompute.objects.get(payroll_period=self.period).payslips_removed, 2)
+
+
+class PeriodCloseTests(PayrollTestCase):
+    def test_period_is_closed_and_accumulated_once(self):
+        from .payroll import close_period, save_payslips
+        self.add_mixed_staff(2)
+        inputs, payslips = self.load_and_compute()
+        save_payslips(self.period, payslips)
+        stale = PayrollPeriod.objects.get(pk=self.period.pk)
+
+        self.assertTrue(close_period(self.period))
+        summaries = PayrollSummary.objects.count()
+        self.assertFalse(close_period(stale))
+        self.assertTrue(stale.is_processed)
+
+        self.assertEqual(PayrollSummary.objects.count(), summaries)
+        for ytd in PayrollYearToDate.objects.all():
+            payslip = payslips[ytd.staff_id]
+            self.assertEqual((ytd.year, ytd.periods), (2025, 1))
+            self.assertEqual((ytd.gross_pay, ytd.net_pay), (payslip['gross_pay'], payslip['net_pay']))
+        self.assertEqual(PayrollYearToDate.objects.count(), 2)
+
+
+class BankExportTests(PayrollTestCase):
+    def setUp(self):
+        super().setUp()
+        from .payroll import save_payslips
+        self.rokel = self.add_staff(2, bank_name='Rokel', bank_sort_code='RCB01', bank_account_number='0012345678')
+        self.rokel += self.add_staff(1, staff_category='junior', staff_grade='j1', bank_name='Rokel', bank_account_number='77')
+        self.unpaid = self.add_staff(1, bank_name='Ecobank', bank_account_number='55')
+        inputs, self.payslips = self.load_and_compute()
+        save_payslips(self.period, self.payslips)
+        Payslip.objects.filter(staff__in=self.unpaid).update(net_pay=0)
+
+    def test_staff_with_no_net_pay_are_left_out(self):
+        from .bank_export import bank_names, csv_lines
+        self.assertEqual(bank_names(self.period), ['Rokel'])
+        self.assertEqual(list(csv_lines(self.period, 'Ecobank'))[1:], ['TOTAL,Ecobank,January 2025,0,0.00\r\n'])
+
+    def test_csv_rows_and_trailer(self):
+        import csv
+        from .bank_export import bank_file_lines
+        rows = list(csv.reader(bank_file_lines(self.period, 'Rokel', 'csv')))
+        self.assertEqual(rows[0], ['Staff ID', 'Name', 'Sort Code', 'Account Number', 'Amount'])
+        self.assertEqual(rows[1:-1], [
+            [staff.staff_id, staff.full_name, staff.bank_sort_code, staff.bank_account_number,
+             f"{self.payslips[staff.id]['net_pay']:.2f}"]
+            for staff in self.rokel
+        ])
+        total = sum(self.payslips[staff.id]['net_pay'] for staff in self.rokel)
+        self.assertEqual(rows[-1], ['TOTAL', 'Rokel', 'January 2025', '3', f'{total:.2f}'])
+
+    def test_fixed_width_records_and_trailer(self):
+        from .bank_export import bank_file_lines
+        header, *details, trailer = bank_file_lines(self.period, 'Rokel', 'fixed')
+        self.assertEqual(len(header), 70)
+        self.assertEqual(header[:31], 'H' + 'Rokel'.ljust(30))
+        cents = [int(self.payslips[staff.id]['net_pay'] * 100) for staff in self.rokel]
+        self.assertEqual(len(details), 3)
+        for line, staff, amount in zip(details, self.rokel, cents):
+            self.assertEqual(len(line), 94)
+            self.assertEqual(line[:13], 'D' + staff.staff_id.ljust(12))
+            self.assertEqual(line[48:93], staff.bank_sort_code.ljust(10) + staff.bank_account_number.ljust(20) + f'{amount:015d}')
+        self.assertEqual(trailer, f'T{3:09d}{sum(cents):018d}\n')
+
+    def test_fixed_width_refuses_account_numbers_that_do_not_fit(self):
+        from .bank_export import BankFileError, bank_file_lines
+        Staff.objects.filter(pk=self.rokel[0].pk).update(bank_account_number='1' * 21)
+        with self.assertRaisesMessage(BankFileError, f'{self.rokel[0].staff_id} (account number)'):
+            bank_file_lines(self.period, 'Rokel', 'fixed')
+
+class LoanRepaymentTests(PayrollTestCase):
+    def add_loan(self, staff, **fields):
+        fields = {
+            'loan_type': 'housing', 'amount': Decimal('1200'), 'interest_rate': Decimal('5'), 'repayment_months': 12,
+            'monthly_deduction': Decimal('105'), 'balance': Decimal('1200'), 'start_deduction_date': date(2025, 1, 15),
+            **fields,
+        }
+        loan = LoanRecord.objects.create(staff=staff, **fields)
+        loan.status = 'active'
+        loan.save()
+        return loan
+
+    def test_closing_posts_installments_of_paid_staff(self):
+        from .payroll import close_period, save_payslips
+        paid, unpaid = self.add_staff(2)
+        paid_loan, unpaid_loan = self.add_loan(paid), self.add_loan(unpaid)
+        inputs, payslips = self.load_and_compute()
+        save_payslips(self.period, {paid.id: payslips[paid.id]})
+        close_period(self.period)
+
+        paid_loan.refresh_from_db()
+        self.assertEqual((paid_loan.amount_paid, paid_loan.balance), (Decimal('105.00'), Decimal('1100.00')))
+        first = paid_loan.installments.get(installment_number=1)
+        self.assertEqual((first.is_paid, first.payroll_period), (True, self.period))
+        unpaid_loan.refresh_from_db()
+        self.assertEqual((unpaid_loan.amount_paid, unpaid_loan.balance), (Decimal('0'), Decimal('1200')))
+        self.assertFalse(unpaid_loan.installments.filter(is_paid=True).exists())
+
+    def test_missed_installment_is_carried_forward(self):
+        from .payroll import close_period, run_payroll
+        staff, = self.add_staff(1)
+        loan = self.add_loan(staff)
+        close_period(self.period)  # nobody was paid in January
+        self.period = PayrollPeriod.objects.create(
+            name='February 2025', start_date=date(2025, 2, 1), end_date=date(2025, 2, 28),
+        )
+        inputs, payslips = self.load_and_compute()
+        self.assertEqual(payslips[staff.id]['loan_deduction'], Decimal('210.00'))
+
+        run_payroll(self.period)
+        loan.refresh_from_db()
+        self.assertEqual((loan.amount_paid, loan.balance), (Decimal('210.00'), Decimal('1000.00')))
+        self.assertEqual(loan.installments.filter(is_paid=True, payroll_period=self.period).count(), 2)
+
+    def test_installment_of_another_open_period_is_not_carried(self):
+        staff, = self.add_staff(1)
+        self.add_loan(staff)
+        self.period = PayrollPeriod.objects.create(
+            name='February 2025', start_date=date(2025, 2, 1), end_date=date(2025, 2, 28),
+        )
+        inputs, payslips = self.load_and_compute()
+        self.assertEqual(payslips[staff.id]['loan_deduction'], Decimal('105.00'))
+
+    def test_repayment_period_must_be_at_least_a_month(self):
+        from django.core.exceptions import ValidationError
+        staff, = self.add_staff(1)
+        loan = LoanRecord(
+            staff=staff, loan_type='housing', amount=Decimal('1200'), repayment_months=0,
+            monthly_deduction=Decimal('0'), balance=Decimal('1200'), start_deduction_date=date(2025, 1, 15),
+        )
+        with self.assertRaises(ValidationError):
+            loan.full_clean()
+        with self.assertRaises(ValueError):
+            loan.generate_schedule()
+
+class PayrollRunTests(PayrollTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_mixed_staff(9)
+
+    def test_resumes_after_the_checkpoint(self):
+        from .payroll import execute_run, start_run
+        run, created = start_run(self.period)
+        first, *rest = sorted(department.pk for department in self.departments)
+        PayrollRun.objects.filter(pk=run.pk).update(status='failed', last_department_id=first)
+        run.refresh_from_db()
+
+        execute_run(run)
+        self.assertEqual((run.status, run.completed_departments, run.payslips_written), ('completed', 3, 6))
+        written = Payslip.objects.filter(payroll_period=self.period).values_list('staff__department_id', flat=True)
+        self.assertEqual(set(written), set(rest))
+
+    def test_stale_run_is_reclaimed(self):
+        from .payroll import RunInProgress, claim_run, execute_run, start_run
+        run, created = start_run(self.period)
+        self.assertTrue(claim_run(run, 'running'))
+        self.assertFalse(claim_run(run, 'running'))
+        with self.assertRaises(RunInProgress):
+            execute_run(run)
+
+        PayrollRun.objects.filter(pk=run.pk).update(
+            updated_at=timezone.now() - PayrollRun.STALE_AFTER - timedelta(minutes=1),
+        )
+        self.assertTrue(claim_run(run, 'running'))
+        self.assertEqual(run.status, 'running')
+
+    def test_concurrent_starts_share_one_run(self):
+        from .payroll import RunInProgress, claim_run, execute_run, start_run
+        winner, created = start_run(self.period)
+        self.assertTrue(created)
+        # The other request looked for an unfinished run before the winner's insert
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            run, created = start_run(self.period)
+        self.assertEqual((run.pk, created), (winner.pk, False))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PayrollRun.objects.create(payroll_period=self.period)
+
+        execute_run(winner)
+        with self.assertRaises(RunInProgress):
+            execute_run(run)
+        self.assertEqual(PayrollRun.objects.filter(payroll_period=self.period).count(), 1)
+
+    def test_failed_run_is_not_revived_while_another_is_active(self):
+        from .payroll import claim_run
+        failed = PayrollRun.objects.create(payroll_period=self.period, status='failed')
+        PayrollRun.objects.create(payroll_period=self.period, status='running')
+        self.assertFalse(claim_run(failed, 'queued'))
+        self.assertEqual(failed.status, 'failed')
+
+
+class PayrollRunHeartbeatTests(TransactionTestCase):
+    def test_heartbeat_keeps_a_computing_run_fresh(self):
+        from .payroll import heartbeat
+        period = PayrollPeriod.objects.create(name='January 2025', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        run = PayrollRun.objects.create(payroll_period=period, status='running')
+        PayrollRun.objects.filter(pk=run.pk).update(
+            updated_at=timezone.now() - PayrollRun.STALE_AFTER - timedelta(minutes=1),
+        )
+        with heartbeat(run, interval=0.01):
+            time.sleep(0.2)
+        run.refresh_from_db()
+        self.assertFalse(run.is_stale)
+
+
+class StatutoryTests(TestCase):
+    TABLE = [(0, 100000, 0), (100000, 300000, 1500), (300000, 500000, 3000)]
+
+    def test_evaluate_matches_evaluate_scalar_at_band_edges(self):
+        from .statutory import evaluate, evaluate_scalar
+        amounts = []
+        for edge in [0, 100000, 300000, 500000]:
+            amounts += [edge - 1, edge, edge + 1]
+        amounts += [123457, 499999, 10000000]
+        amounts = [cents for cents in amounts if cents >= 0]
+
+        batch = evaluate(np.array(amounts, dtype=np.int64), self.TABLE)
+        for cents, result in zip(amounts, batch.tolist()):
+            scalar = evaluate_scalar(Decimal(cents).scaleb(-2), self.TABLE)
+            self.assertEqual(Decimal(result).scaleb(-2), scalar, f'salary of {cents} cents')
+
+    def test_capped_top_band(self):
+        from .statutory import evaluate_scalar
+        # 2000.00 at 15% plus 2000.00 at 30%, however far the salary is above the cap
+        self.assertEqual(evaluate_scalar(Decimal('5000.00'), self.TABLE), Decimal('900.00'))
+        self.assertEqual(evaluate_scalar(Decimal('99999.99'), self.TABLE), Decimal('900.00'))
+
+
+class MergedDaysTests(TestCase):
+    START, END = date(2025, 1, 1), date(2025, 1, 31)
+
+    def merged(self, *intervals):
+        from .payroll import merged_days
+        return merged_days(sorted(intervals), self.START, self.END)
+
+    def test_overlapping_intervals_count_once(self):
+        self.assertEqual(self.merged((date(2025, 1, 5), date(2025, 1, 10)), (date(2025, 1, 8), date(2025, 1, 12))), 8)
+        self.assertEqual(self.merged((date(2025, 1, 5), date(2025, 1, 20)), (date(2025, 1, 8), date(2025, 1, 12))), 16)
+
+    def test_adjacent_and_separate_intervals(self):
+        self.assertEqual(self.merged((date(2025, 1, 1), date(2025, 1, 3)), (date(2025, 1, 4), date(2025, 1, 5))), 5)
+        self.assertEqual(self.merged((date(2025, 1, 1), date(2025, 1, 3)), (date(2025, 1, 10), date(2025, 1, 11))), 5)
+
+    def test_intervals_are_clipped_to_the_period(self):
+        self.assertEqual(self.merged((date(2024, 12, 20), date(2025, 1, 2))), 2)
+        self.assertEqual(self.merged((date(2025, 1, 30), date(2025, 2, 10))), 2)
+        self.assertEqual(self.merged((date(2024, 12, 1), date(2025, 3, 1))), 31)
+        self.assertEqual(self.merged((date(2024, 12, 1), date(2024, 12, 31))), 0)
+        self.assertEqual(self.merged(), 0)
+
+
+class RetirementDueTests(StaffTestCase):
+    def test_queryset_matches_is_retirement_due(self):
+        settings = SystemSettings.get_settings()
+        today = date.today()
+        for months in range(-2, settings.retirement_notification_months + 3):
+            for day in [1, 15, 28]:
+                retirement = today.replace(day=1) + relativedelta(months=months, day=day)
+                self.add_staff(1, date_of_birth=retirement - relativedelta(years=settings.retirement_age))
+
+        expected = {staff.pk for staff in Staff.objects.all() if staff.is_retirement_due}
+        self.assertTrue(expected)
+        self.assertEqual(set(Staff.objects.retirement_due().values_list('pk', flat=True)), expected)
+
+    def test_inactive_staff_are_excluded(self):
+        settings = SystemSettings.get_settings()
+        retirement = date.today().replace(day=1) + relativedelta(months=2)
+        staff, = self.add_staff(1, date_of_birth=retirement - relativedelta(years=settings.retirement_age))
+        self.assertTrue(staff.is_retirement_due)
+        self.assertEqual(list(Staff.objects.retirement_due()), [staff])
+        Staff.objects.filter(pk=staff.pk).update(status='retired')
+        self.assertEqual(list(Staff.objects.retirement_due()), [])
+
+
+
+class ContractRenewalMilestoneTests(StaffTestCase):
+    def due_dates(self, staff):
+        return dict(staff.renewal_milestones.values_list('years', 'due_date'))
+
+    def test_milestones_follow_contract_date_and_employment_type(self):
+        staff, = self.add_staff(1, hire_date=date(2020, 3, 1))
+        self.assertEqual(self.due_dates(staff), {2: date(2022, 3, 1), 4: date(2024, 3, 1)})
+        staff.renewal_milestones.filter(years=2).update(notified_at=timezone.now())
+
+        staff.contract_start_date = date(2021, 6, 1)
+        staff.save()
+        self.assertEqual(self.due_dates(staff), {2: date(2023, 6, 1), 4: date(2025, 6, 1)})
+        self.assertFalse(staff.renewal_milestones.filter(notified_at__isnull=False).exists())
+
+        staff.renewal_milestones.filter(years=2).update(notified_at=timezone.now())
+        staff.employment_type = 'contract'
+        staff.save()
+        self.assertEqual(self.due_dates(staff), {2: date(2023, 6, 1)})
+
+    def test_command_queues_each_due_milestone_once(self):
+        from io import StringIO
+        from django.core.management import call_command
+        officer, = self.add_staff(1, employment_type='contract')
+        HRMO.objects.create(user=User.objects.create_user('hrmo', 'hrmo@usl.edu.sl'), staff=officer)
+        staff, = self.add_staff(1, hire_date=date.today() - relativedelta(years=2, days=5))
+        self.add_staff(1, hire_date=date.today() - relativedelta(years=2, days=-5))  # not yet due
+
+        call_command('check_contract_renewals', stdout=StringIO())
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('recipients', flat=True)), ['hrmo@usl.edu.sl', staff.email],
+        )
+        milestone = ContractRenewalMilestone.objects.get(staff=staff, years=2)
+        self.assertIsNotNone(milestone.notified_at)
+
+        call_command('check_contract_renewals', stdout=StringIO())
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+
+class SystemSettingsCacheTests(StaffTestCase):
+    def test_save_invalidates_memo_and_shared_cache(self):
+        from django.core.cache import cache
+        settings = SystemSettings.get_settings()
+        with self.assertNumQueries(0):
+            SystemSettings.get_settings()
+
+        settings.retirement_age = 62
+        with self.captureOnCommitCallbacks(execute=True):
+            settings.save()
+        self.assertIsNone(cache.get(SystemSettings.CACHE_KEY))
+        with self.assertNumQueries(1):
+            self.assertEqual(SystemSettings.get_settings().retirement_age, 62)
+        self.assertEqual(cache.get(SystemSettings.CACHE_KEY).retirement_age, 62)
+
+    def test_request_picks_up_a_save_from_another_worker(self):
+        from django.core.cache import cache
+        from django.core.signals import request_started
+        age = SystemSettings.get_settings().retirement_age
+        # What a save in another worker leaves behind: a new row and no shared entry
+        SystemSettings.objects.filter(pk=1).update(retirement_age=age + 1)
+        cache.delete(SystemSettings.CACHE_KEY)
+        self.assertEqual(SystemSettings.get_settings().retirement_age, age)
+
+        request_started.send(sender=None)
+        self.assertEqual(SystemSettings.get_settings().retirement_age, age + 1)
+
+class SimulationTests(StaffTestCase):
+    def setUp(self):
+        super().setUp()
+        SalaryStructure.objects.create(
+            staff_category='senior', staff_grade='1', employment_type='full_time', basic_salary=Decimal('1000'),
+        )
+        self.add_staff(4)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@usl.edu.sl', 'password'))
+
+    def post(self, scenario):
+        return self.client.post(reverse('payroll_simulation_api'), scenario, content_type='application/json')
+
+    def test_raise_is_costed(self):
+        response = self.post({'months': 2, 'variants': [{'name': 'Raise', 'changes': [{'percent': 10}]}]})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['baseline']['total_cost'], 8000.0)
+        self.assertEqual(result['variants'][0]['delta'], 800.0)
+
+    def test_malformed_scenarios_are_rejected(self):
+        for scenario in [
+            {'variants': 'ab'},
+            {'variants': [1]},
+            {'variants': [{'changes': 5}]},
+            {'variants': [{'changes': [{'percent': 'NaN'}]}]},
+            {'variants': [{'changes': [{'amount': 'inf'}]}]},
+            {'variants': [{'changes': [{'percent': '1e400'}]}]},
+            {'variants': [{'changes': [{'basic_salary': 'NaN'}]}]},
+            {'variants': [{'changes': [{'percent': 1e308}, {'percent': 1e308}]}]},
+        ]:
+            response = self.post(scenario)
+            self.assertEqual(response.status_code, 400, scenario)
+            self.assertIn('error', response.json())
+
+
+class DirectoryPagingTests(StaffTestCase):
+    PAGE_SIZE = 5
+
+    def setUp(self):
+        super().setUp()
+        self.add_staff(12)
+
+    def page(self, **params):
+        from .directory import staff_page
+        query = QueryDict(mutable=True)
+        query.update(params)
+        return staff_page(query, page_size=self.PAGE_SIZE)
+
+    def test_next_then_previous_round_trip(self):
+        for sort in ['staff_id', '-staff_id', 'name', '-hire_date']:
+            pages = [self.page(sort=sort)]
+            while pages[-1]['next_cursor']:
+                pages.append(self.page(sort=sort, after=pages[-1]['next_cursor']))
+            rows = [staff.pk for page in pages for staff in page['rows']]
+            self.assertEqual(len(rows), 12, sort)
+            self.assertEqual(len(set(rows)), 12, sort)
+            self.assertIsNone(pages[0]['previous_cursor'])
+
+            for index in range(len(pages) - 1, 0, -1):
+                previous = self.page(sort=sort, before=pages[index]['previous_cursor'])
+                self.assertEqual([staff.pk for staff in previous['rows']], [staff.pk for staff in pages[index - 1]['rows']])
+
+    def test_tampered_cursor_lists_the_first_page(self):
+        from .directory import encode_cursor
+        first = [staff.pk for staff in self.page(sort='hire_date')['rows']]
+        for values in [['not a date', 1], ['2015-01-01', 'x'], ['2015-01-01', [1]], ['2015-01-01']]:
+            page = self.page(sort='hire_date', after=encode_cursor(values))
+            self.assertEqual([staff.pk for staff in page['rows']], first, values)
+        self.assertEqual([staff.pk for staff in self.page(sort='hire_date', after='%%%')['rows']], first)
+
+
+class FakeConnection:
+    """Mail backend connection that fails the recipients listed in `errors`"""
+
+    def __init__(self, errors=None, open_error=None):
+        self.errors = errors or {}
+        self.open_error = open_error
+        self.sent = []
+        self.closed = 0
+
+    def open(self):
+        if self.open_error:
+            raise self.open_error
+
+    def close(self):
+        self.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            error = self.errors.get(message.to[0])
+            if error:
+                raise error
+            self.sent.append(message)
+        return len(messages)
+
+
+class OutboxTests(TestCase):
+    def queue(self, recipient):
+        return OutboundEmail.queue('Subject', 'Body', 'hr@usl.edu.sl', [recipient])
+
+    def test_sends_due_messages(self):
+        from .outbox import send_batch
+        email = self.queue('a@usl.edu.sl')
+        connection = FakeConnection()
+        self.assertEqual(send_batch(connection), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 1))
+        self.assertEqual(send_batch(connection), (0, 0))
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        from .outbox import RETRY_DELAY, send_batch
+        email = self.queue('a@usl.edu.sl')
+        other = self.queue('b@usl.edu.sl')
+        connection = FakeConnection({'a@usl.edu.sl': smtplib.SMTPResponseException(451, b'Try again later')})
+        before = timezone.now()
+        self.assertEqual(send_batch(connection), (1, 1))
+        email.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreaterEqual(email.next_attempt_at, before + RETRY_DELAY)
+        self.assertIn('451', email.last_error)
+        self.assertEqual(other.status, 'sent')
+        # Not due again until the delay has passed
+        self.assertEqual(send_batch(FakeConnection()), (0, 0))
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_batch(FakeConnection()), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
+
+    def test_permanent_refusal_fails_at_once(self):
+        from .outbox import send_batch
+        email = self.queue('gone@usl.edu.sl')
+        refused = smtplib.SMTPRecipientsRefused({'gone@usl.edu.sl': (550, b'No such user')})
+        self.assertEqual(send_batch(FakeConnection({'gone@usl.edu.sl': refused})), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 1))
+
+    def test_last_attempt_fails_the_message(self):
+        from .outbox import MAX_ATTEMPTS, send_batch
+        email = self.queue('a@usl.edu.sl')
+        OutboundEmail.objects.filter(pk=email.pk).update(attempts=MAX_ATTEMPTS - 1)
+        error = smtplib.SMTPResponseException(421, b'Service not available')
+        self.assertEqual(send_batch(FakeConnection({'a@usl.edu.sl': error})), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', MAX_ATTEMPTS))
+
+    def test_unreachable_server_does_not_use_an_attempt(self):
+        from .outbox import send_batch
+        email = self.queue('a@usl.edu.sl')
+        with self.assertRaises(ConnectionRefusedError):
+            send_batch(FakeConnection(open_error=ConnectionRefusedError()))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 0))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+
+class AnnouncementFanOutTests(TransactionTestCase):
+    EMAILS = [f'staff{number}@usl.edu.sl' for number in range(5)]
+
+    def setUp(self):
+        user = User.objects.create_user('hrmo')
+        self.announcement = Announcement.objects.create(
+            title='Closure', content='The campus is closed on Friday.', created_by=user, send_email=True,
+        )
+        AnnouncementDelivery.objects.bulk_create(
+            AnnouncementDelivery(announcement=self.announcement, email=email) for email in self.EMAILS
+        )
+
+    def send(self):
+        from .bulk_mail import send_announcement
+        return send_announcement(self.announcement, concurrency=1, rate=0)
+
+    def test_outcomes_are_saved_before_the_next_send(self):
+        from . import bulk_mail
+        sent_before = []
+        send_message = bulk_mail.send_message
+
+        def dies_on_fourth(connection, message):
+            sent_before.append(AnnouncementDelivery.objects.filter(status='sent').count())
+            if len(sent_before) == 4:
+                raise RuntimeError('worker died')
+            send_message(connection, message)
+
+        with mock.patch.object(bulk_mail, 'send_message', dies_on_fourth), self.assertRaises(RuntimeError):
+            self.send()
+        self.assertEqual(sent_before, [0, 1, 2, 3])
+        self.assertEqual(len(mail.outbox), 3)
+
+        # A rerun mails only the recipients who had not been sent to
+        sent, failed, seconds = self.send()
+        self.assertEqual((sent, failed), (2, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(self.EMAILS))
+
+    def test_permanent_refusal_is_not_retried(self):
+        from . import bulk_mail
+        refused = smtplib.SMTPRecipientsRefused({self.EMAILS[0]: (550, b'No such user')})
+        send_message = bulk_mail.send_message
+
+        def refuse_first(connection, message):
+            if message.to == [self.EMAILS[0]]:
+                raise refused
+            send_message(connection, message)
+
+        with mock.patch.object(bulk_mail, 'send_message', refuse_first):
+            sent, failed, seconds = self.send()
+        self.assertEqual((sent, failed), (4, 1))
+        delivery = AnnouncementDelivery.objects.get(email=self.EMAILS[0])
+        self.assertEqual((delivery.status, delivery.attempts), ('failed', 1))
+        self.assertEqual(AnnouncementDelivery.objects.filter(status='sent', sent_at__isnull=False).count(), 4)
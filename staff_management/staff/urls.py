@@ -7,6 +7,7 @@ urlpatterns = [
     
     # Staff URLs
     path('staff/', views.staff_list, name='staff_list'),
+    path('staff/lookup/', views.staff_lookup, name='staff_lookup'),
     path('staff/add/', views.staff_create, name='staff_create'),
     path('staff/<int:pk>/edit/', views.staff_update, name='staff_update'),
     path('staff/<int:pk>/delete/', views.staff_delete, name='staff_delete'),
@@ -88,6 +89,11 @@ urlpatterns = [
     path('payroll/', views.payroll_dashboard, name='payroll_dashboard'),
     path('payroll/create-period/', views.create_payroll_period, name='create_payroll_period'),
     path('payroll/process/', views.process_payroll, name='process_payroll'),
+    path('payroll/periods/<int:pk>/preview/', views.payroll_preview, name='payroll_preview'),
+    path('payroll/runs/<int:pk>/progress/', views.payroll_run_progress, name='payroll_run_progress'),
+    path('payroll/year-to-date/', views.payroll_year_to_date, name='payroll_year_to_date'),
+    path('payroll/simulation/', views.payroll_simulation, name='payroll_simulation'),
+    path('payroll/simulation/api/', views.payroll_simulation_api, name='payroll_simulation_api'),
     path('payroll/salary-structures/', views.salary_structure_list, name='salary_structure_list'),
     path('payroll/salary-structures/create/', views.salary_structure_create, name='salary_structure_create'),
     path('payroll/loans/', views.loan_list, name='loan_list'),
@@ -95,6 +101,9 @@ urlpatterns = [
     path('payroll/loans/<int:pk>/approve/', views.loan_approve, name='loan_approve'),
     path('payroll/payslips/', views.payslip_list, name='payslip_list'),
     path('payroll/leave-balances/', views.leave_balance_list, name='leave_balance_list'),
+    path('payroll/periods/<int:pk>/payslips.zip', views.export_period_payslips, name='export_period_payslips'),
+    path('payroll/periods/<int:pk>/summary/', views.payroll_period_summary, name='payroll_period_summary'),
+    path('payroll/periods/<int:pk>/bank-file/', views.export_bank_file, name='export_bank_file'),
     path('payslip/<int:pk>/pdf/', views.generate_payslip_pdf, name='generate_payslip_pdf'),
     path('my-payslips/', views.my_payslips, name='my_payslips'),
     path('my-leave-balance/', views.my_leave_balance, name='my_leave_balance'),
@@ -1,13 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.db.models import Count, Q
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse, Http404
+from django.utils import timezone
+from django.utils.text import slugify
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth import update_session_auth_hash
 from django.core.mail import send_mail
 from django.conf import settings
-from .models import Staff, Department, School, Leave, Promotion, Retirement, Bereavement, HRMO
+from .models import Staff, Department, School, Leave, Promotion, Retirement, Bereavement, HRMO, ContractRenewalMilestone, OutboundEmail
 from datetime import date
 from .forms import StaffForm, LeaveForm, PromotionForm, RetirementForm, BereavementForm, SchoolForm, DepartmentForm
 import io
@@ -63,12 +65,10 @@ def dashboard(request):
         recent_promotions = Promotion.objects.select_related('staff').order_by('-created_at')[:5]
         
         # Get staff due for retirement
-        staff_due_retirement = Staff.objects.filter(status='active')
-        retirement_due = [staff for staff in staff_due_retirement if staff.is_retirement_due][:5]
+        retirement_due = Staff.objects.retirement_due()[:5]
         
-        # Get staff needing contract renewal notifications
-        staff_needing_renewal = Staff.objects.filter(status='active')
-        contract_renewals_due = [staff for staff in staff_needing_renewal if staff.needs_contract_renewal_notification][:5]
+        # Get contract renewal milestones awaiting notification
+        contract_renewals_due = ContractRenewalMilestone.objects.due()[:5]
         
         context = {
             'total_staff': total_staff,
@@ -115,9 +115,46 @@ def staff_list(request):
         messages.error(request, 'Access denied. HRMO privileges required.')
         return redirect('dashboard')
     
-    staff = Staff.objects.select_related('department__school').filter(status='active')
+    from .directory import SORT_LABELS, staff_page
+    from .facets import sidebar
+    
+    page = staff_page(request.GET)
+    query = request.GET.copy()
+    for param in ['after', 'before']:
+        query.pop(param, None)
     is_hrmo = request.user.is_superuser or hasattr(request.user, 'hrmo')
-    return render(request, 'staff/staff_list.html', {'staff': staff, 'is_hrmo': is_hrmo})
+    return render(request, 'staff/staff_list.html', {
+        'staff': page['rows'],
+        'page': page,
+        'query': query.urlencode(),
+        'sort_labels': SORT_LABELS,
+        'facets': sidebar(request.GET),
+        'departments': Department.objects.order_by('name').only('id', 'name'),
+        'schools': School.objects.order_by('name').only('id', 'name'),
+        'staff_types': Staff.STAFF_TYPES,
+        'grades': Staff.GRADE_CHOICES,
+        'statuses': Staff.STATUS_CHOICES,
+        'is_hrmo': is_hrmo,
+    })
+
+@login_required
+def staff_lookup(request):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    
+    from .fuzzy import lookup_staff
+    
+    matches = lookup_staff(request.GET.get('q', '')[:100], queryset=Staff.objects.filter(status='active'))
+    return JsonResponse({'results': [
+        {
+            'id': staff.id,
+            'staff_id': staff.staff_id,
+            'name': staff.full_name,
+            'department': staff.department.name,
+            'score': round(score, 3),
+        }
+        for staff, score in matches
+    ]})
 
 @login_required
 def staff_create(request):
@@ -381,9 +418,7 @@ def retirement_create(request):
         form = RetirementForm()
         
     # Get staff due for retirement for dropdown
-    from .models import SystemSettings
-    staff_due_retirement = Staff.objects.filter(status='active')
-    retirement_due = [staff for staff in staff_due_retirement if staff.is_retirement_due]
+    retirement_due = Staff.objects.retirement_due()
     return render(request, 'staff/retirement_form.html', {
         'form': form, 
         'title': 'Process Retirement',
@@ -1223,9 +1258,7 @@ def check_retirement_notifications(request):
         messages.error(request, 'Access denied. HRMO privileges required.')
         return redirect('dashboard')
     
-    from .models import SystemSettings
-    staff_due_retirement = Staff.objects.filter(status='active')
-    retirement_due = [staff for staff in staff_due_retirement if staff.is_retirement_due]
+    retirement_due = list(Staff.objects.retirement_due().select_related('department'))
     
     # Send notifications
     for staff in retirement_due:
@@ -1256,12 +1289,11 @@ def send_retirement_notification(staff):
         Human Resources
         '''
         
-        send_mail(
+        OutboundEmail.queue(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             [staff.email],
-            fail_silently=True,
         )
     
     # Send to HRMOs
@@ -1282,12 +1314,11 @@ def send_retirement_notification(staff):
         Please initiate retirement processing procedures.
         '''
         
-        send_mail(
+        OutboundEmail.queue(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             hrmo_emails,
-            fail_silently=True,
         )
 
 @login_required
@@ -1394,20 +1425,14 @@ def announcement_create(request):
                 departments = Department.objects.filter(id__in=department_ids)
                 announcement.specific_departments.set(departments)
             
-            # Send emails if requested
+            # Send emails if requested, one per recipient from a background worker
             if send_email:
-                target_staff = announcement.get_target_staff()
-                staff_emails = [staff.email for staff in target_staff if staff.email]
+                recipients = announcement.create_deliveries()
                 
-                if staff_emails:
-                    send_mail(
-                        subject=f"{announcement.get_announcement_type_display()}: {title}",
-                        message=content,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=staff_emails,
-                        fail_silently=True,
-                    )
-                    messages.success(request, f'Announcement created and sent to {len(staff_emails)} staff members!')
+                if recipients:
+                    from .background import spawn_command
+                    spawn_command('send_announcement', announcement.pk)
+                    messages.success(request, f'Announcement created and is being emailed to {recipients} staff members!')
                 else:
                     messages.success(request, 'Announcement created successfully!')
             else:
@@ -1440,7 +1465,14 @@ def announcement_detail(request, pk):
         messages.error(request, 'Access denied.')
         return redirect('announcement_list')
     
-    return render(request, 'staff/announcement_detail.html', {'announcement': announcement})
+    delivery_counts = {}
+    if is_hrmo and announcement.send_email:
+        delivery_counts = dict(announcement.deliveries.values_list('status').annotate(count=Count('id')).order_by())
+    
+    return render(request, 'staff/announcement_detail.html', {
+        'announcement': announcement,
+        'delivery_counts': delivery_counts,
+    })
 
 @login_required
 def hrmo_list(request):
@@ -1513,21 +1545,20 @@ def check_contract_renewals(request):
         messages.error(request, 'Access denied. HRMO privileges required.')
         return redirect('dashboard')
     
-    staff_needing_renewal = Staff.objects.filter(status='active')
-    renewal_due = [staff for staff in staff_needing_renewal if staff.needs_contract_renewal_notification]
+    renewal_due = list(ContractRenewalMilestone.objects.due())
     
     # Send notifications
-    for staff in renewal_due:
-        send_contract_renewal_notification(staff)
+    for milestone in renewal_due:
+        send_contract_renewal_notification(milestone)
     
     messages.success(request, f'Checked contract renewals. {len(renewal_due)} staff need contract renewal notifications.')
-    return render(request, 'staff/contract_renewal_notifications.html', {'staff_list': renewal_due})
+    return render(request, 'staff/contract_renewal_notifications.html', {'milestones': renewal_due})
 
-def send_contract_renewal_notification(staff):
+def send_contract_renewal_notification(milestone):
     """Send contract renewal notification to staff and HRMO"""
-    contract_date = staff.contract_start_date if staff.contract_start_date else staff.hire_date
-    today = date.today()
-    years_since_contract = int((today - contract_date).days / 365.25)
+    staff = milestone.staff
+    contract_date = staff.contract_date
+    years_since_contract = milestone.years
     
     # Send to staff
     if staff.email:
@@ -1547,12 +1578,11 @@ def send_contract_renewal_notification(staff):
         Human Resources
         '''
         
-        send_mail(
+        OutboundEmail.queue(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             [staff.email],
-            fail_silently=True,
         )
     
     # Send to HRMOs
@@ -1574,17 +1604,16 @@ def send_contract_renewal_notification(staff):
         Please initiate contract renewal procedures.
         '''
         
-        send_mail(
+        OutboundEmail.queue(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             hrmo_emails,
-            fail_silently=True,
         )
     
     # Mark notification as sent
-    staff.contract_renewal_notification_sent = True
-    staff.save()
+    milestone.notified_at = timezone.now()
+    milestone.save(update_fields=['notified_at'])
 
 @login_required
 def reset_user_password(request, pk):
@@ -1704,21 +1733,145 @@ def payroll_dashboard(request):
         messages.error(request, 'Access denied. HRMO privileges required.')
         return redirect('dashboard')
     
-    from .models import PayrollPeriod, Payslip, SalaryStructure
+    from .models import PayrollPeriod, Payslip, SalaryStructure, PayrollSummary
+    from django.db.models import Prefetch
     
     current_period = PayrollPeriod.objects.filter(is_processed=False).first()
-    recent_periods = PayrollPeriod.objects.all()[:5]
+    current_run = current_period.runs.first() if current_period else None
+    recent_recomputes = current_period.recomputes.select_related('triggered_by')[:5] if current_period else []
+    recent_periods = PayrollPeriod.objects.select_related('processed_by').prefetch_related(
+        Prefetch('summaries', queryset=PayrollSummary.objects.filter(dimension='total'), to_attr='total_summaries')
+    )[:5]
     total_staff = Staff.objects.filter(status='active').count()
     salary_structures = SalaryStructure.objects.filter(is_active=True).count()
     
     context = {
         'current_period': current_period,
+        'current_run': current_run,
+        'recent_recomputes': recent_recomputes,
         'recent_periods': recent_periods,
         'total_staff': total_staff,
         'salary_structures': salary_structures,
     }
     return render(request, 'staff/payroll_dashboard.html', context)
 
+@login_required
+def payroll_period_summary(request, pk):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
+    
+    from .models import PayrollPeriod, PayrollSummary
+    from .bank_export import bank_names
+    
+    period = get_object_or_404(PayrollPeriod, pk=pk, is_processed=True)
+    summaries = {dimension: [] for dimension, label in PayrollSummary.DIMENSIONS}
+    for summary in period.summaries.all():
+        summaries[summary.dimension].append(summary)
+    
+    return render(request, 'staff/payroll_period_summary.html', {
+        'period': period,
+        'total': summaries['total'][0] if summaries['total'] else None,
+        'breakdowns': [
+            (label, summaries[dimension]) for dimension, label in PayrollSummary.DIMENSIONS if dimension != 'total'
+        ],
+        'banks': bank_names(period),
+        'benefit_costs': period.benefit_costs.select_related('benefit_plan'),
+    })
+
+@login_required
+def payroll_year_to_date(request):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
+    
+    from .models import PayrollYearToDate
+    from .payroll import YEAR_TO_DATE_FIELDS
+    from django.core.paginator import Paginator
+    from django.db.models import Sum
+    
+    years = list(PayrollYearToDate.objects.values_list('year', flat=True).distinct().order_by('-year'))
+    year = years[0] if years else date.today().year
+    if request.GET.get('year', '').isdigit():
+        year = int(request.GET['year'])
+    
+    rows = PayrollYearToDate.objects.filter(year=year).select_related('staff__department').order_by('staff__staff_id')
+    totals = rows.aggregate(staff_count=Count('id'), **{field: Sum(field) for field in YEAR_TO_DATE_FIELDS})
+    page = Paginator(rows, 100).get_page(request.GET.get('page'))
+    return render(request, 'staff/payroll_year_to_date.html', {
+        'year': year,
+        'years': years,
+        'totals': totals,
+        'page': page,
+    })
+
+@login_required
+def export_bank_file(request, pk):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
+    
+    from .models import PayrollPeriod
+    from .bank_export import FORMATS, BankFileError, bank_file_lines, bank_filename, bank_names
+    
+    period = get_object_or_404(PayrollPeriod, pk=pk, is_processed=True)
+    bank_name = request.GET.get('bank', '')
+    if bank_name not in bank_names(period):
+        raise Http404('No transfers to this bank in the period')
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    
+    try:
+        lines = bank_file_lines(period, bank_name, fmt)
+    except BankFileError as e:
+        messages.error(request, str(e))
+        return redirect('payroll_period_summary', pk=period.pk)
+    
+    response = StreamingHttpResponse(
+        lines,
+        content_type='text/csv' if fmt == 'csv' else 'text/plain',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{bank_filename(period, bank_name, fmt)}"'
+    return response
+
+@login_required
+def payroll_simulation(request):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
+    
+    from .simulation import month_start
+    
+    return render(request, 'staff/payroll_simulation.html', {
+        'start': month_start(None).strftime('%Y-%m'),
+        'categories': Staff.STAFF_CATEGORIES,
+        'grades': Staff.GRADE_CHOICES,
+        'employment_types': Staff.EMPLOYMENT_TYPES,
+    })
+
+@login_required
+def payroll_simulation_api(request):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a scenario as JSON.'}, status=405)
+    
+    import json
+    import time
+    from .simulation import simulate, SimulationError
+    
+    try:
+        scenario = json.loads(request.body)
+        if not isinstance(scenario, dict):
+            raise SimulationError('The scenario must be a JSON object')
+        start = time.perf_counter()
+        result = simulate(scenario)
+    except (ValueError, SimulationError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return JsonResponse(result)
+
 @login_required
 def process_payroll(request):
     if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
@@ -1726,9 +1879,9 @@ def process_payroll(request):
         return redirect('dashboard')
     
     if request.method == 'POST':
-        from .models import PayrollPeriod, Payslip, SalaryStructure, LoanRecord
-        from datetime import datetime
-        from decimal import Decimal
+        from .models import PayrollPeriod
+        from .payroll import claim_run, start_run
+        from .background import spawn_command
         
         period_id = request.POST.get('period_id')
         try:
@@ -1737,69 +1890,71 @@ def process_payroll(request):
                 messages.error(request, 'This payroll period has already been processed.')
                 return redirect('payroll_dashboard')
             
-            active_staff = Staff.objects.filter(status='active')
-            processed_count = 0
-            
-            for staff in active_staff:
-                try:
-                    salary_structure = SalaryStructure.objects.get(
-                        staff_category=staff.staff_category,
-                        staff_grade=staff.staff_grade,
-                        employment_type=staff.employment_type,
-                        is_active=True
-                    )
-                except SalaryStructure.DoesNotExist:
-                    continue
-                
-                active_loans = LoanRecord.objects.filter(
-                    staff=staff, 
-                    status='active',
-                    start_deduction_date__lte=period.end_date,
-                    end_deduction_date__gte=period.start_date
-                )
-                loan_deduction = sum(loan.monthly_deduction for loan in active_loans)
-                
-                income_tax = salary_structure.basic_salary * Decimal('0.10')
-                nassit = salary_structure.basic_salary * Decimal('0.05')
-                
-                payslip, created = Payslip.objects.get_or_create(
-                    staff=staff,
-                    payroll_period=period,
-                    defaults={
-                        'basic_salary': salary_structure.basic_salary,
-                        'housing_allowance': salary_structure.housing_allowance,
-                        'transport_allowance': salary_structure.transport_allowance,
-                        'medical_allowance': salary_structure.medical_allowance,
-                        'other_allowances': salary_structure.other_allowances,
-                        'income_tax': income_tax,
-                        'nassit_contribution': nassit,
-                        'loan_deduction': loan_deduction,
-                        'gross_pay': Decimal('0.00'),
-                        'total_deductions': Decimal('0.00'),
-                        'net_pay': Decimal('0.00'),
-                    }
-                )
-                
-                payslip.calculate_totals()
-                payslip.save()
-                processed_count += 1
-            
-            period.is_processed = True
-            period.processed_by = request.user
-            period.processed_date = datetime.now()
-            period.save()
+            # An existing run is only restarted if it failed or stalled, and only by one request
+            run, created = start_run(period, request.user)
+            if not created and not claim_run(run, 'queued'):
+                messages.warning(request, 'Payroll is already running for this period.')
+                return redirect('payroll_dashboard')
             
-            messages.success(request, f'Payroll processed successfully for {processed_count} staff members!')
+            spawn_command('run_payroll', period.id, '--run', run.id, '--workers', settings.PAYROLL_WORKERS)
+            if run.last_department_id is not None:
+                messages.success(request, f'Payroll run resumed from department {run.completed_departments + 1} of {run.total_departments}.')
+            else:
+                messages.success(request, 'Payroll processing started in the background.')
             
         except Exception as e:
             messages.error(request, f'Error processing payroll: {str(e)}')
     
     return redirect('payroll_dashboard')
 
+@login_required
+def payroll_preview(request, pk):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
+    
+    from .models import PayrollPeriod
+    from .payroll import preview_payroll
+    from django.core.paginator import Paginator
+    
+    period = get_object_or_404(PayrollPeriod, pk=pk)
+    if period.is_processed:
+        messages.info(request, 'This payroll period has already been processed.')
+        return redirect('payslip_list')
+    
+    preview = preview_payroll(period)
+    rows = preview['changed_staff'] if request.GET.get('changed') else preview['rows']
+    page = Paginator(rows, 100).get_page(request.GET.get('page'))
+    return render(request, 'staff/payroll_preview.html', {
+        'preview': preview,
+        'period': period,
+        'page': page,
+        'show_changed': bool(request.GET.get('changed')),
+    })
+
+@login_required
+def payroll_run_progress(request, pk):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    
+    from .models import PayrollRun
+    run = get_object_or_404(PayrollRun, pk=pk)
+    return JsonResponse({
+        'id': run.id,
+        'period': run.payroll_period.name,
+        'status': run.status,
+        'total_departments': run.total_departments,
+        'completed_departments': run.completed_departments,
+        'payslips_written': run.payslips_written,
+        'progress_percent': run.progress_percent,
+        'can_resume': run.can_resume,
+        'error_message': run.error_message,
+    })
+
 @login_required
 def generate_payslip_pdf(request, pk):
     from .models import Payslip
-    payslip = get_object_or_404(Payslip, pk=pk)
+    payslip = get_object_or_404(Payslip.objects.select_related('staff__department', 'payroll_period'), pk=pk)
     
     is_hrmo = request.user.is_superuser or hasattr(request.user, 'hrmo')
     is_own_payslip = False
@@ -1815,46 +1970,54 @@ def generate_payslip_pdf(request, pk):
         messages.error(request, 'Access denied.')
         return redirect('dashboard')
     
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
+    from .payslip_pdf import payslip_data, payslip_digest, payslip_filename, cached_payslip_path
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from django.utils.http import http_date, quote_etag
+    
+    data = payslip_data(payslip)
+    digest = payslip_digest(data)
+    path = cached_payslip_path(data, digest)
+    etag = quote_etag(digest)
+    last_modified = int(path.stat().st_mtime)
+    
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type='application/pdf', as_attachment=True, filename=payslip_filename(data))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def export_period_payslips(request, pk):
+    if not (request.user.is_superuser or hasattr(request.user, 'hrmo')):
+        messages.error(request, 'Access denied. HRMO privileges required.')
+        return redirect('dashboard')
     
-    title = Paragraph("UNIVERSITY OF SIERRA LEONE - PAYSLIP", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
+    from .models import PayrollPeriod
+    from .background import spawn_command
+    from .payslip_pdf import BATCH_MODES, claim_export, export_path
+    import os
     
-    info_data = [
-        ['Staff:', payslip.staff.full_name, 'ID:', payslip.staff.staff_id],
-        ['Department:', payslip.staff.department.name, 'Period:', payslip.payroll_period.name],
-    ]
-    
-    info_table = Table(info_data)
-    story.append(info_table)
-    story.append(Spacer(1, 20))
-    
-    pay_data = [
-        ['EARNINGS', '', 'DEDUCTIONS', ''],
-        ['Basic Salary', f'{payslip.basic_salary:,.2f}', 'Income Tax', f'{payslip.income_tax:,.2f}'],
-        ['Allowances', f'{payslip.housing_allowance + payslip.transport_allowance + payslip.medical_allowance + payslip.other_allowances:,.2f}', 'NASSIT', f'{payslip.nassit_contribution:,.2f}'],
-        ['', '', 'Loans', f'{payslip.loan_deduction:,.2f}'],
-        ['GROSS PAY', f'{payslip.gross_pay:,.2f}', 'TOTAL DEDUCTIONS', f'{payslip.total_deductions:,.2f}'],
-        ['NET PAY', f'{payslip.net_pay:,.2f}', '', ''],
-    ]
-    
-    pay_table = Table(pay_data)
-    pay_table.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-    ]))
+    period = get_object_or_404(PayrollPeriod, pk=pk)
+    if not period.is_processed:
+        messages.error(request, f'Payslips of "{period.name}" can be exported once the period has been processed.')
+        return redirect('payroll_dashboard')
     
-    story.append(pay_table)
-    doc.build(story)
+    mode = request.GET.get('mode', 'zip')
+    if mode not in BATCH_MODES:
+        mode = 'zip'
     
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="payslip_{payslip.staff.staff_id}.pdf"'
-    return response
+    path = export_path(period.pk, mode)
+    if os.path.exists(path):
+        suffix = '_by_department' if mode == 'department' else ''
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'payslips_{slugify(period.name)}{suffix}.zip')
+    
+    if claim_export(path):
+        spawn_command('export_payslips', period.pk, '--mode', mode, '--output', path,
+                      '--workers', settings.PAYROLL_WORKERS)
+    messages.info(request, f'Payslips of "{period.name}" are being prepared. Download them again in a few minutes.')
+    return redirect('payroll_dashboard')
 
 @login_required
 def my_payslips(request):
@@ -1862,7 +2025,11 @@ def my_payslips(request):
         staff = Staff.objects.get(email=request.user.email)
         from .models import Payslip
         payslips = Payslip.objects.filter(staff=staff).order_by('-payroll_period__start_date')
-        return render(request, 'staff/my_payslips.html', {'payslips': payslips, 'staff': staff})
+        return render(request, 'staff/my_payslips.html', {
+            'payslips': payslips,
+            'staff': staff,
+            'year_to_date': staff.year_to_date.all(),
+        })
     except Staff.DoesNotExist:
         messages.error(request, 'Staff record not found.')
         return redirect('dashboard')
@@ -1999,6 +2166,8 @@ def loan_create(request):
             amount = Decimal(request.POST['amount'])
             interest_rate = Decimal(request.POST.get('interest_rate', '0'))
             repayment_months = int(request.POST['repayment_months'])
+            if repayment_months < 1:
+                raise ValueError('Repayment period must be at least one month')
             
             loan = LoanRecord.objects.create(
                 staff=staff,
@@ -2036,8 +2205,10 @@ def loan_approve(request, pk):
     loan = get_object_or_404(LoanRecord, pk=pk)
     
     if request.method == 'POST':
+        from .payroll import open_periods, snapshot_inputs, recompute_payslips
         action = request.POST.get('action')
         if action == 'approve':
+            inputs_before = snapshot_inputs(open_periods())
             loan.status = 'active'
             loan.approval_date = date.today()
             loan.approved_by = request.user
@@ -2048,10 +2219,16 @@ def loan_approve(request, pk):
             loan.status = 'rejected'
             messages.success(request, f'Loan rejected for {loan.staff.full_name}!')
         
+        # Saving the loan as active generates its installment schedule (see signals)
         loan.save()
+        if action == 'approve':
+            recompute_payslips(
+                'loan', loan.pk, f'Loan approved for {loan.staff.full_name}',
+                lambda row: row['id'] == loan.staff_id, inputs_before, 'loan_deductions', request.user,
+            )
         return redirect('loan_list')
     
-    return render(request, 'staff/loan_approve.html', {'loan': loan})
+    return render(request, 'staff/loan_approve.html', {'loan': loan, 'installments': loan.installments.select_related('payroll_period')})
 
 # Performance Evaluation Views
 @login_required